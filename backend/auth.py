@@ -1,20 +1,80 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 import bcrypt
 import os
+import time
 from dotenv import load_dotenv
+from metrics import password_hash_duration, record_span
 load_dotenv()
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-def hash_password(password: str):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# bcrypt cost and the process pool that runs it off the request workers
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+class PasswordHasherBusy(Exception):
+    pass
+
+_password_pool = None
+_password_jobs_pending = 0
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
 
 def verify_password(plain_password, hashed_password):
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def password_needs_rehash(hashed_password: str):
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def _get_password_pool():
+    global _password_pool
+    if _password_pool is None:
+        # spawn: never fork the event loop and Mongo client threads into workers
+        _password_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _password_pool
+
+async def _run_password_job(fn, *args):
+    global _password_jobs_pending
+    if _password_jobs_pending >= PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHasherBusy()
+    _password_jobs_pending += 1
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_password_pool(), fn, *args)
+    finally:
+        _password_jobs_pending -= 1
+        elapsed = time.perf_counter() - start
+        password_hash_duration.observe(elapsed, fn.__name__)
+        record_span("bcrypt", elapsed)
+
+async def hash_password_async(password: str):
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+def shutdown_password_pool():
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(cancel_futures=True)
+        _password_pool = None
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -24,4 +84,3 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 def decode_access_token(token: str):
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
-
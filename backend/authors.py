@@ -0,0 +1,32 @@
+from bson import ObjectId
+from database import db
+
+async def fetch_authors(docs):
+    # Resolve every author referenced by docs with a single $in lookup
+    user_ids = {d["user_id"] for d in docs if "user_id" in d and ObjectId.is_valid(d["user_id"])}
+    if not user_ids:
+        return {}
+    users = await db.users.find(
+        {"_id": {"$in": [ObjectId(uid) for uid in user_ids]}}, {"username": 1}
+    ).to_list()
+    return {str(u["_id"]): u["username"] for u in users}
+
+def set_author(doc, authors, kind: str):
+    if "user_id" in doc:
+        if ObjectId.is_valid(doc["user_id"]):
+            username = authors.get(str(ObjectId(doc["user_id"])))
+            if username:
+                doc["author"] = username
+                doc["author_avatar"] = username[:2].upper()
+            else:
+                doc["author"] = "Unknown User"
+                doc["author_avatar"] = "U"
+        else:
+            # Handle invalid ObjectId (legacy data)
+            print(f"Warning: Invalid user_id '{doc['user_id']}' for {kind} {doc['_id']}")
+            doc["author"] = "Legacy User"
+            doc["author_avatar"] = "LU"
+    else:
+        doc["author"] = "Anonymous"
+        doc["author_avatar"] = "A"
+    return doc
@@ -0,0 +1,299 @@
+# Load-test and micro-benchmark harness for the API.
+#
+#   cd backend
+#   MONGO_URI=mongodb://localhost:27017 python -m bench.run --output bench.json
+#   python -m bench.run --baseline bench.json --max-regression 0.2
+#
+# Seeds a throwaway database (DB_NAME must contain "bench"), runs the app
+# in-process through its lifespan and drives every router over an ASGI client.
+# Results are written as JSON; with --baseline the run fails when any route's
+# p95 latency or throughput regresses by more than --max-regression.
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("DB_NAME", "stackit_bench")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("AI_INDEX_DIR", tempfile.mkdtemp(prefix="stackit-bench-"))
+
+import httpx
+
+import database
+import main
+from auth import create_access_token
+from bench import stubs
+from bench.seed import TAGS, seed
+from routes import ai
+from routes.questions import serialize_question
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(p * len(sorted_values)), len(sorted_values) - 1)]
+
+def summarize(latencies_ms, elapsed, errors):
+    latencies_ms = sorted(latencies_ms)
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "rps": round(len(latencies_ms) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies_ms, 0.50), 3),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 3),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3),
+    }
+
+def scenarios(data, rng):
+    # name -> (make_request(i) -> (method, url, kwargs, token_user), acceptable statuses).
+    # Method "SSE" opens an event stream and times the first event.
+    qids, aids, uids = data["question_ids"], data["answer_ids"], data["user_ids"]
+    admin = data["admin_id"]
+    counter = iter(range(10**9))
+
+    def vote_user(i):
+        # Each request votes as a different user so most votes are first votes
+        return uids[i % len(uids)]
+
+    return {
+        "GET /questions": (lambda i: ("GET", "/questions", {}, None), {200}),
+        "GET /questions?sort=votes": (lambda i: ("GET", "/questions?sort=votes", {}, None), {200}),
+        "GET /questions?sort=unanswered": (lambda i: ("GET", "/questions?sort=unanswered", {}, None), {200}),
+        "GET /questions?tag": (lambda i: ("GET", "/questions?tag=python", {}, None), {200}),
+        "GET /questions/{id}": (lambda i: ("GET", f"/questions/{rng.choice(qids)}", {}, None), {200}),
+        "GET /questions/{id}/answers": (lambda i: ("GET", f"/questions/{rng.choice(qids)}/answers", {}, None), {200}),
+        "GET /search": (lambda i: ("GET", "/search?q=async+cache", {}, None), {200}),
+        "GET /notifications": (lambda i: ("GET", "/notifications", {}, rng.choice(uids)), {200}),
+        "GET /notifications/count": (lambda i: ("GET", "/notifications/count", {}, rng.choice(uids)), {200}),
+        "SSE /notifications/stream": (lambda i: ("SSE", "/notifications/stream", {}, rng.choice(uids)), {200}),
+        "GET /tags": (lambda i: ("GET", "/tags", {}, None), {200}),
+        "GET /tags?sort=recent": (lambda i: ("GET", "/tags?sort=recent", {}, None), {200}),
+        "GET /tags/{tag}": (lambda i: ("GET", f"/tags/{rng.choice(TAGS)}", {}, None), {200}),
+        "GET /tags/{tag}/questions": (lambda i: ("GET", f"/tags/{rng.choice(TAGS)}/questions", {}, None), {200}),
+        "GET /tags/{tag}/questions?sort=unanswered": (lambda i: (
+            "GET", f"/tags/{rng.choice(TAGS)}/questions?sort=unanswered", {}, None
+        ), {200}),
+        "POST /questions": (lambda i: ("POST", "/questions", {"json": {
+            "title": f"Benchmark question {next(counter)}",
+            "description": "<p>How do I make this faster?</p>",
+            "tags": ["python", "fastapi"],
+        }}, rng.choice(uids)), {200}),
+        "POST /questions/{id}/answers": (lambda i: ("POST", f"/questions/{rng.choice(qids)}/answers", {"json": {
+            "content": f"<p>Try an index @user{rng.randrange(len(uids))} ({next(counter)})</p>",
+        }}, rng.choice(uids)), {200}),
+        "POST /questions/{id}/vote": (lambda i: ("POST", f"/questions/{rng.choice(qids)}/vote", {
+            "json": {"direction": rng.choice(["up", "down"])},
+        }, vote_user(i)), {200, 400}),
+        "POST /answers/{id}/vote": (lambda i: ("POST", f"/answers/{rng.choice(aids)}/vote", {
+            "json": {"direction": rng.choice(["up", "down"])},
+        }, vote_user(i)), {200, 400}),
+        "POST /questions/{id}/flag": (lambda i: ("POST", f"/questions/{rng.choice(qids)}/flag", {}, rng.choice(uids)), {200}),
+        "GET /admin/flags": (lambda i: ("GET", "/admin/flags", {}, admin), {200}),
+        "GET /admin/moderation-queue": (lambda i: ("GET", "/admin/moderation-queue", {}, admin), {200}),
+        "GET /admin/export/questions": (lambda i: ("GET", "/admin/export/questions", {}, admin), {200}),
+        "GET /admin/export/answers?format=json": (lambda i: (
+            "GET", "/admin/export/answers?format=json", {}, admin
+        ), {200}),
+        "POST /login": (lambda i: ("POST", "/login", {"json": {
+            "email": f"user{rng.randrange(len(uids))}@bench.example.com", "password": "benchmark",
+        }}, None), {200, 503}),
+        "POST /ai/suggest-tags": (lambda i: ("POST", "/ai/suggest-tags", {"json": {
+            "title": "Async Mongo queries", "description": f"cursor latency {i}",
+        }}, None), {200}),
+        "POST /ai/similar-questions": (lambda i: ("POST", "/ai/similar-questions", {"json": {
+            "title": "How to cache tokens", "description": f"thread pool {i}",
+        }}, None), {200}),
+        "POST /ai/summarize-answer": (lambda i: ("POST", "/ai/summarize-answer", {"json": {
+            "content": f"answer text number {i % 50} " * 20,
+        }}, None), {200}),
+    }
+
+async def first_event(app, url: str, token: str):
+    # httpx's ASGI transport waits for the whole body, which an event stream
+    # never finishes. Call the app directly, wait for the first event, then
+    # disconnect. Returns the response status.
+    received = asyncio.Event()
+    status = None
+
+    async def receive():
+        await received.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            received.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "server": ("bench", 80), "client": ("bench", 1), "root_path": "",
+        "path": url, "raw_path": url.encode(), "query_string": f"token={token}".encode(), "headers": [],
+    }
+    await asyncio.wait_for(app(scope, receive, send), 10)
+    return status
+
+async def drive(client, make_request, ok_statuses, tokens, requests, concurrency):
+    latencies, errors = [], 0
+    next_index = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            method, url, kwargs, user_id = make_request(i)
+            headers = {"Authorization": f"Bearer {tokens[user_id]}"} if user_id else {}
+            start = time.perf_counter()
+            if method == "SSE":
+                status = await first_event(main.app, url, tokens[user_id])
+            else:
+                status = (await client.request(method, url, headers=headers, **kwargs)).status_code
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status not in ok_statuses:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+def time_call(fn, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies, sum(latencies) / 1000, 0)
+
+async def time_async_call(fn, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies, sum(latencies) / 1000, 0)
+
+async def micro_benchmarks(data, tokens, iterations):
+    from deps import get_principal, principal_cache
+
+    authors = {uid: f"user{i}" for i, uid in enumerate(data["user_ids"])}
+    question = {
+        "_id": data["question_ids"][0],
+        "title": "t",
+        "description": "d",
+        "user_id": data["user_ids"][1],
+        "tags": ["python"],
+        "answer_count": 2,
+    }
+    token = tokens[data["user_ids"][1]]
+
+    async def principal_cold():
+        principal_cache.clear()
+        await get_principal(token)
+
+    return {
+        "serialize_question": time_call(lambda: serialize_question(dict(question), authors), iterations * 10),
+        "auth.get_principal (cached)": await time_async_call(lambda: get_principal(token), iterations),
+        "auth.get_principal (uncached)": await time_async_call(principal_cold, iterations),
+        "ai.embed_text (stub, batched)": time_call(lambda: ai.embed_text("benchmark text"), iterations),
+    }
+
+def check_regressions(results, baseline, max_regression):
+    failures = []
+    for name, current in results["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if not previous:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            failures.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - max_regression):
+            failures.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        if current["errors"] > previous["errors"]:
+            failures.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return failures
+
+async def run(args):
+    if "bench" not in database.DB_NAME and not args.force:
+        sys.exit(f"Refusing to drop database '{database.DB_NAME}'; use a *bench* DB_NAME or --force")
+
+    await database.connect()
+    await database.client.drop_database(database.DB_NAME)
+    data = await seed(
+        users=args.users,
+        questions=args.questions,
+        answers_per_question=args.answers_per_question,
+        flags=args.flags,
+    )
+    await database.close()
+
+    stubs.install(ai)
+    rng = random.Random(args.seed)
+    tokens = {
+        uid: create_access_token({"user_id": uid, "username": f"user{i}"})
+        for i, uid in enumerate(data["user_ids"])
+    }
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "users": args.users,
+            "questions": args.questions,
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "routes": {},
+    }
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, (make_request, ok_statuses) in scenarios(data, rng).items():
+                if args.routes and not any(r in name for r in args.routes):
+                    continue
+                results["routes"][name] = await drive(
+                    client, make_request, ok_statuses, tokens, args.requests, args.concurrency
+                )
+                r = results["routes"][name]
+                print(f"{name:42} {r['rps']:>9} rps  p50 {r['p50_ms']:>8}ms  "
+                      f"p95 {r['p95_ms']:>8}ms  p99 {r['p99_ms']:>8}ms  errors {r['errors']}")
+        results["micro"] = await micro_benchmarks(data, tokens, args.micro_iterations)
+        results["batching"] = [b.stats() for b in ai.batchers.values()]
+        for name, r in results["micro"].items():
+            print(f"{name:42} p50 {r['p50_ms']:>8}ms  p95 {r['p95_ms']:>8}ms")
+        await database.client.drop_database(database.DB_NAME)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regressions(results, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="StackIt API benchmark")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--answers-per-question", type=int, default=3)
+    parser.add_argument("--flags", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--micro-iterations", type=int, default=200)
+    parser.add_argument("--routes", nargs="*", help="only run routes whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--force", action="store_true", help="allow a DB_NAME without 'bench'")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
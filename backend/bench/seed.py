@@ -0,0 +1,118 @@
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+from auth import hash_password
+from database import db
+
+TAGS = ["react", "python", "fastapi", "mongodb", "jwt", "docker", "nextjs", "typescript", "css", "sql"]
+WORDS = (
+    "how why when index query cursor async await token cache latency thread pool "
+    "deploy build error config route model schema page render state hook server client"
+).split()
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+async def _insert(collection, docs, batch_size=5000):
+    for start in range(0, len(docs), batch_size):
+        await db[collection].insert_many(docs[start:start + batch_size], ordered=False)
+
+async def seed(users=200, questions=2000, answers_per_question=3, votes_per_question=5,
+               notifications_per_user=20, flags=200, seed=42):
+    # Synthetic dataset shaped like what the routers write. Returns the ids the
+    # load driver needs to build requests.
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password = hash_password("benchmark", rounds=4)
+
+    user_docs = [
+        {
+            "_id": ObjectId(),
+            "username": f"user{i}",
+            "email": f"user{i}@bench.example.com",
+            "password": password,
+            "created_at": now,
+            "is_admin": i == 0,
+        }
+        for i in range(users)
+    ]
+    await _insert("users", user_docs)
+    user_ids = [str(u["_id"]) for u in user_docs]
+
+    question_docs, answer_docs, vote_docs = [], [], []
+    for i in range(questions):
+        created = now - timedelta(minutes=questions - i)
+        qid = ObjectId()
+        n_answers = rng.randint(0, answers_per_question * 2)
+        question_docs.append({
+            "_id": qid,
+            "title": _sentence(rng, 8).capitalize() + "?",
+            "description": f"<p>{_sentence(rng, 60)}</p>",
+            "tags": rng.sample(TAGS, 3),
+            "user_id": rng.choice(user_ids),
+            "created_at": created,
+            "updated_at": created,
+            "accepted_answer_id": None,
+            "votes": 0,
+            "answer_count": n_answers,
+            "version": 0,
+        })
+        for voter in rng.sample(user_ids, min(votes_per_question, len(user_ids))):
+            direction = rng.choice(["up", "up", "down"])
+            question_docs[-1]["votes"] += 1 if direction == "up" else -1
+            vote_docs.append({
+                "target_type": "question",
+                "target_id": str(qid),
+                "user_id": voter,
+                "direction": direction,
+                "created_at": created,
+                "updated_at": created,
+            })
+        for _ in range(n_answers):
+            answer_docs.append({
+                "_id": ObjectId(),
+                "question_id": str(qid),
+                "content": f"<p>{_sentence(rng, 80)} @user{rng.randrange(users)}</p>",
+                "user_id": rng.choice(user_ids),
+                "created_at": created,
+                "updated_at": created,
+                "is_accepted": False,
+                "votes": 0,
+            })
+    await _insert("questions", question_docs)
+    await _insert("answers", answer_docs)
+    await _insert("votes", vote_docs)
+
+    notification_docs = [
+        {
+            "user_id": uid,
+            "message": "someone answered your question",
+            "link": f"/questions/{rng.choice(question_docs)['_id']}",
+            "read": rng.random() < 0.7,
+            "created_at": now - timedelta(minutes=rng.randrange(10000)),
+        }
+        for uid in user_ids
+        for _ in range(notifications_per_user)
+    ]
+    await _insert("notifications", notification_docs)
+
+    flag_docs = []
+    for _ in range(flags):
+        if answer_docs and rng.random() < 0.5:
+            item_type, item_id = "answer", str(rng.choice(answer_docs)["_id"])
+        else:
+            item_type, item_id = "question", str(rng.choice(question_docs)["_id"])
+        flag_docs.append({
+            "type": item_type,
+            "item_id": item_id,
+            "flagged_by": rng.choice(user_ids),
+            "created_at": now - timedelta(minutes=rng.randrange(10000)),
+        })
+    await _insert("flags", flag_docs)
+
+    return {
+        "user_ids": user_ids,
+        "admin_id": user_ids[0],
+        "question_ids": [str(q["_id"]) for q in question_docs],
+        "answer_ids": [str(a["_id"]) for a in answer_docs],
+    }
@@ -0,0 +1,23 @@
+import hashlib
+import numpy as np
+
+EMBEDDING_DIM = 384
+
+def _vector(text: str):
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+
+def embed_texts(texts):
+    return [_vector(t) for t in texts]
+
+def summarize_batch(texts):
+    return [{"summary_text": " ".join(t.split()[:30])} for t in texts]
+
+def install(ai):
+    # Swap the model-backed paths in routes/ai.py for deterministic stand-ins so
+    # the AI endpoints can be measured without torch or model downloads. What is
+    # left is the routing, batching, caching and index work around inference.
+    ai.embed_texts = embed_texts
+    ai.batchers["embed"].batch_fn = embed_texts
+    ai.batchers["bart"].batch_fn = summarize_batch
+    ai.batchers["t5"].batch_fn = summarize_batch
@@ -0,0 +1,435 @@
+import asyncio
+import html
+import json
+import os
+import re
+import shutil
+import threading
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from bson import ObjectId
+from database import documents_after, run_command
+import jobs
+from config import COMPLETION_DIR
+from file_lock import file_lock
+
+# Word completion for /ai/next-word from a trigram model of the corpus.
+#
+# The compacted model is an array-backed trie on disk, memory-mapped on load:
+#   vocab.txt          sorted words; a word's id is its line number, so every
+#                      word sharing a prefix is one contiguous id range
+#   unigrams.npy       count per word id
+#   bigram_*.npy       CSR rows per previous word: next ids (sorted) + counts
+#   trigram_*.npy      CSR rows per sorted (w1 * V + w2) pair key
+# Text posted since the last compaction sits in an in-memory delta that
+# queries merge in. Once COMPLETION_DELTA_MAX n-grams have accumulated a
+# background job compacts: it reads the posts after the generation's marks
+# back from the database and merges them into a new generation. Compactions
+# never merge a delta, so a post is counted once however many workers saw or
+# replayed it.
+COMPLETION_DELTA_MAX = int(os.getenv("COMPLETION_DELTA_MAX", "50000"))
+# Posts replayed at startup, and merged per compaction, per collection
+COMPLETION_CATCHUP_LIMIT = int(os.getenv("COMPLETION_CATCHUP_LIMIT", "10000"))
+# ObjectIds from different processes are only ordered to the second, so
+# compactions leave the newest few seconds of posts for the next one
+COMPLETION_SETTLE_SECONDS = float(os.getenv("COMPLETION_SETTLE_SECONDS", "5"))
+MAX_WORD_LENGTH = 40
+# Most delta words scanned per prefix lookup; keeps one-letter prefixes cheap
+DELTA_SCAN_LIMIT = 512
+# Rows kept per level before merging with the deltas and the next level
+CANDIDATE_POOL = 4
+
+_BLOCK_TAGS = re.compile(r"</?(?:p|br|li|div|h[1-6]|pre|ul|ol|blockquote)\b[^>]*>", re.IGNORECASE)
+_TAGS = re.compile(r"<[^>]+>")
+_SENTENCE_BREAK = re.compile(r"[.!?;:]+(?:\s|$)|\n")
+_WORD = re.compile(r"[a-z0-9](?:[a-z0-9+#_'-]|\.(?=[a-z0-9]))*")
+_TRAILING_WORD = re.compile(_WORD.pattern + "$")
+_CLOSING_TAGS = re.compile(r"(?:</[^>]+>\s*)+$")
+
+def tokenize(text: str):
+    # Editor HTML -> sentences of lowercase words
+    text = html.unescape(_TAGS.sub(" ", _BLOCK_TAGS.sub("\n", text or ""))).lower()
+    return [
+        words for words in (
+            [w for w in _WORD.findall(segment) if len(w) <= MAX_WORD_LENGTH]
+            for segment in _SENTENCE_BREAK.split(text)
+        ) if words
+    ]
+
+def editor_text(text: str):
+    # Editor HTML up to the caret as plain text. Quill closes the paragraph
+    # after the caret; left in, that would read as a sentence break.
+    text = _CLOSING_TAGS.sub("", text or "")
+    return html.unescape(_TAGS.sub(" ", _BLOCK_TAGS.sub("\n", text)))
+
+def _ngrams(sentences):
+    for words in sentences:
+        for i, word in enumerate(words):
+            yield word, words[i - 1] if i >= 1 else None, words[i - 2] if i >= 2 else None
+
+class _Delta:
+    def __init__(self):
+        self.unigrams = Counter()
+        self.words = []  # sorted keys of unigrams, for prefix ranges
+        self.bigrams = {}
+        self.trigrams = {}
+        self.size = 0
+        self.marks = {}
+        self.docs = []  # (kind, doc_id, sentences), to drop merged ones later
+
+    def after(self, marks):
+        # A delta of just the documents newer than marks
+        delta = _Delta()
+        for kind, doc_id, sentences in self.docs:
+            if doc_id > marks.get(kind, ""):
+                delta.add(kind, doc_id, sentences)
+        return delta
+
+    def add(self, kind, doc_id, sentences):
+        self.docs.append((kind, doc_id, sentences))
+        if doc_id > self.marks.get(kind, ""):
+            self.marks[kind] = doc_id
+        for word, prev, prev2 in _ngrams(sentences):
+            if word not in self.unigrams:
+                self.words.insert(bisect_left(self.words, word), word)
+            self.unigrams[word] += 1
+            self.size += 1
+            if prev is not None:
+                self.bigrams.setdefault(prev, Counter())[word] += 1
+                self.size += 1
+            if prev2 is not None:
+                self.trigrams.setdefault((prev2, prev), Counter())[word] += 1
+                self.size += 1
+
+def _top(ids, counts, k: int):
+    if len(ids) > k:
+        keep = np.argpartition(-counts, k - 1)[:k]
+        ids, counts = ids[keep], counts[keep]
+    return ids, counts
+
+def _aggregate(columns, counts):
+    # Sum counts over identical rows; returns the unique rows sorted by columns
+    if not len(counts):
+        return [c[:0] for c in columns], counts[:0]
+    order = np.lexsort(columns[::-1])
+    columns = [c[order] for c in columns]
+    counts = counts[order]
+    changed = np.zeros(len(counts), dtype=bool)
+    changed[0] = True
+    for c in columns:
+        changed[1:] |= c[1:] != c[:-1]
+    starts = np.flatnonzero(changed)
+    return [c[starts] for c in columns], np.add.reduceat(counts, starts)
+
+class CompletionModel:
+    def __init__(self, path: str, delta_max: int = COMPLETION_DELTA_MAX):
+        self.path = path
+        self.lock_path = os.path.join(path, "LOCK")
+        self.delta_max = delta_max
+        self._lock = threading.Lock()
+        self._generation = None
+        self._base = None
+        self._delta = _Delta()
+        self.marks = {}
+
+    def _generation_dir(self):
+        current = os.path.join(self.path, "CURRENT")
+        if not os.path.exists(current):
+            return None
+        with open(current) as f:
+            return os.path.join(self.path, f.read().strip())
+
+    def _read_generation(self, directory):
+        if not directory:
+            return None, {}
+        with open(os.path.join(directory, "vocab.txt"), encoding="utf-8") as f:
+            vocab = f.read().splitlines()
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in (
+                "unigrams", "bigram_offsets", "bigram_next", "bigram_counts",
+                "trigram_pairs", "trigram_offsets", "trigram_next", "trigram_counts",
+            )
+        }
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        # Most frequent words, for suggestions with no prefix and no context
+        top = np.argsort(-np.asarray(arrays["unigrams"]), kind="stable")[:64]
+        base = {"vocab": vocab, "ids": {w: i for i, w in enumerate(vocab)}, "top": top, **arrays}
+        return base, meta.get("marks", {})
+
+    def load(self):
+        # Swaps in the generation CURRENT names, if it changed, and drops the
+        # delta documents it already covers
+        with file_lock(self.lock_path, shared=True):
+            directory = self._generation_dir()
+            if directory == self._generation and directory is not None:
+                return self
+            base, marks = self._read_generation(directory)
+        with self._lock:
+            self._generation = directory
+            self._base = base
+            self.marks = marks
+            self._delta = self._delta.after(marks)
+        return self
+
+    def _write_generation(self, vocab, unigrams, bigrams, trigrams, marks):
+        generation = 0
+        directory = self._generation_dir()
+        if directory:
+            generation = int(os.path.basename(directory).split("-")[1]) + 1
+        # The pid keeps workers that compact at the same time apart
+        name = f"gen-{generation}-{os.getpid()}"
+        target = os.path.join(self.path, name)
+        os.makedirs(target, exist_ok=True)
+        with open(os.path.join(target, "vocab.txt"), "w", encoding="utf-8") as f:
+            f.write("".join(w + "\n" for w in vocab))
+        arrays = {"unigrams": unigrams, **bigrams, **trigrams}
+        for key, value in arrays.items():
+            np.save(os.path.join(target, f"{key}.npy"), value)
+        with open(os.path.join(target, "meta.json"), "w") as f:
+            json.dump({"marks": marks, "words": len(vocab)}, f)
+        # Readers follow CURRENT; replace it atomically, then drop the old
+        # generation (its files stay readable through open memory maps)
+        tmp = os.path.join(self.path, f"CURRENT.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def observe(self, kind: str, doc_id: str, text: str):
+        # Returns True once the delta is due for a compaction
+        sentences = tokenize(text)
+        with self._lock:
+            if doc_id <= self.marks.get(kind, ""):
+                return False
+            self._delta.add(kind, doc_id, sentences)
+            return self._delta.size >= self.delta_max
+
+    async def compact(self, limit: int = COMPLETION_CATCHUP_LIMIT):
+        # Merges up to limit posts per collection after the marks into a new
+        # generation; returns how many. While another worker holds the lock
+        # this only picks up what it wrote.
+        merged = 0
+        with file_lock(self.lock_path, blocking=False) as acquired:
+            if acquired:
+                directory = self._generation_dir()
+                base, marks = await asyncio.to_thread(self._read_generation, directory)
+                settled = ObjectId.from_datetime(
+                    datetime.now(timezone.utc) - timedelta(seconds=COMPLETION_SETTLE_SECONDS)
+                )
+                docs = []
+                for collection, kind, projection, text_of in SOURCES:
+                    async for doc in documents_after(collection, projection, marks.get(kind), limit, settled):
+                        docs.append((kind, str(doc["_id"]), text_of(doc)))
+                if docs:
+                    delta = await asyncio.to_thread(_delta_of, docs)
+                    await asyncio.to_thread(self._merge, base, marks, delta)
+                    merged = len(docs)
+        await asyncio.to_thread(self.load)
+        return merged
+
+    def _merge(self, base, marks, delta):
+        old_vocab = base["vocab"] if base else []
+        vocab = sorted(set(old_vocab) | set(delta.unigrams))
+        ids = {w: i for i, w in enumerate(vocab)}
+        size = len(vocab)
+
+        unigrams = np.zeros(size, dtype=np.int64)
+        bigram_cols = [[], []]
+        bigram_counts = []
+        trigram_cols = [[], [], []]
+        trigram_counts = []
+        if base:
+            remap = np.fromiter((ids[w] for w in old_vocab), dtype=np.int64, count=len(old_vocab))
+            unigrams[remap] += base["unigrams"]
+            rows = np.diff(base["bigram_offsets"])
+            bigram_cols[0].append(remap[np.repeat(np.arange(len(old_vocab)), rows)])
+            bigram_cols[1].append(remap[base["bigram_next"]])
+            bigram_counts.append(np.asarray(base["bigram_counts"], dtype=np.int64))
+            pairs = np.repeat(np.asarray(base["trigram_pairs"]), np.diff(base["trigram_offsets"]))
+            trigram_cols[0].append(remap[pairs // len(old_vocab)])
+            trigram_cols[1].append(remap[pairs % len(old_vocab)])
+            trigram_cols[2].append(remap[base["trigram_next"]])
+            trigram_counts.append(np.asarray(base["trigram_counts"], dtype=np.int64))
+
+        for word, count in delta.unigrams.items():
+            unigrams[ids[word]] += count
+        rows = [(ids[p], ids[w], c) for p, nexts in delta.bigrams.items() for w, c in nexts.items()]
+        if rows:
+            rows = np.array(rows, dtype=np.int64)
+            bigram_cols[0].append(rows[:, 0])
+            bigram_cols[1].append(rows[:, 1])
+            bigram_counts.append(rows[:, 2])
+        rows = [
+            (ids[a], ids[b], ids[w], c)
+            for (a, b), nexts in delta.trigrams.items() for w, c in nexts.items()
+        ]
+        if rows:
+            rows = np.array(rows, dtype=np.int64)
+            for i in range(3):
+                trigram_cols[i].append(rows[:, i])
+            trigram_counts.append(rows[:, 3])
+
+        def concat(parts, dtype=np.int64):
+            return np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+
+        (prev, nxt), counts = _aggregate([concat(c) for c in bigram_cols], concat(bigram_counts))
+        bigrams = {
+            "bigram_offsets": np.searchsorted(prev, np.arange(size + 1)).astype(np.int64),
+            "bigram_next": nxt.astype(np.int32),
+            "bigram_counts": counts.astype(np.uint32),
+        }
+        (a, b, nxt), counts = _aggregate([concat(c) for c in trigram_cols], concat(trigram_counts))
+        pair_keys = a * size + b
+        starts = np.flatnonzero(np.r_[True, pair_keys[1:] != pair_keys[:-1]]) if len(pair_keys) else pair_keys
+        trigrams = {
+            "trigram_pairs": pair_keys[starts].astype(np.int64),
+            "trigram_offsets": np.r_[starts, len(pair_keys)].astype(np.int64),
+            "trigram_next": nxt.astype(np.int32),
+            "trigram_counts": counts.astype(np.uint32),
+        }
+        marks = dict(marks)
+        for kind, mark in delta.marks.items():
+            marks[kind] = max(marks.get(kind, ""), mark)
+        self._write_generation(vocab, unigrams.astype(np.uint32), bigrams, trigrams, marks)
+
+    def _base_candidates(self, base, context, lo, hi, k):
+        # (ids, counts) of base words in [lo, hi) following context
+        if not context:
+            if hi - lo == len(base["vocab"]):
+                ids = base["top"][:k]
+                return ids, np.asarray(base["unigrams"][ids])
+            return _top(np.arange(lo, hi), np.asarray(base["unigrams"][lo:hi]), k)
+        if len(context) == 1:
+            prev = base["ids"].get(context[0])
+            if prev is None:
+                return None
+            start, end = base["bigram_offsets"][prev], base["bigram_offsets"][prev + 1]
+            nexts, counts = base["bigram_next"], base["bigram_counts"]
+        else:
+            a, b = base["ids"].get(context[0]), base["ids"].get(context[1])
+            if a is None or b is None:
+                return None
+            key = a * len(base["vocab"]) + b
+            pairs = base["trigram_pairs"]
+            row = int(np.searchsorted(pairs, key))
+            if row == len(pairs) or pairs[row] != key:
+                return None
+            start, end = base["trigram_offsets"][row], base["trigram_offsets"][row + 1]
+            nexts, counts = base["trigram_next"], base["trigram_counts"]
+        row_ids = nexts[start:end]
+        first = start + int(np.searchsorted(row_ids, lo))
+        last = start + int(np.searchsorted(row_ids, hi))
+        return _top(np.asarray(nexts[first:last]), np.asarray(counts[first:last]), k)
+
+    def _level(self, base, deltas, context, prefix, k):
+        scores = Counter()
+        if base is not None:
+            vocab = base["vocab"]
+            lo = bisect_left(vocab, prefix)
+            hi = bisect_left(vocab, prefix + "\uffff") if prefix else len(vocab)
+            if lo < hi:
+                found = self._base_candidates(base, context, lo, hi, k * CANDIDATE_POOL)
+                if found is not None:
+                    for i, count in zip(*found):
+                        scores[vocab[i]] += int(count)
+        for delta in deltas:
+            if not context:
+                start = bisect_left(delta.words, prefix)
+                for word in delta.words[start:start + DELTA_SCAN_LIMIT]:
+                    if not word.startswith(prefix):
+                        break
+                    scores[word] += delta.unigrams[word]
+                continue
+            nexts = delta.bigrams.get(context[0]) if len(context) == 1 else delta.trigrams.get(tuple(context))
+            for word, count in (nexts or {}).items():
+                if word.startswith(prefix):
+                    scores[word] += count
+        return [w for w, _ in scores.most_common(k)]
+
+    def suggest(self, text: str, k: int = 5):
+        # Completes the word being typed, or predicts the next one after a
+        # space. Backs off from trigram to bigram to unigram counts until k
+        # distinct words are found.
+        text = editor_text(text).lower()
+        partial = ""
+        if text and not text[-1].isspace():
+            match = _TRAILING_WORD.search(text)
+            partial = match.group(0) if match else ""
+            text = text[:len(text) - len(partial)]
+        sentences = tokenize(text) if text.strip() else []
+        ends_sentence = bool(_SENTENCE_BREAK.search(text[-2:])) if text else True
+        context = sentences[-1][-2:] if sentences and not ends_sentence else []
+
+        with self._lock:
+            base, deltas = self._base, [self._delta]
+        suggestions = []
+        for n in range(len(context), -1, -1):
+            for word in self._level(base, deltas, context[len(context) - n:], partial, k):
+                if word not in suggestions and word != partial:
+                    suggestions.append(word)
+            if len(suggestions) >= k:
+                break
+        return suggestions[:k]
+
+def _delta_of(docs):
+    delta = _Delta()
+    for kind, doc_id, text in docs:
+        delta.add(kind, doc_id, tokenize(text))
+    return delta
+
+completion_model = CompletionModel(COMPLETION_DIR)
+_compaction = {"queued": False}
+
+async def compact_completion_model():
+    try:
+        await completion_model.compact()
+    finally:
+        _compaction["queued"] = False
+
+def observe_text(kind: str, doc_id: str, text: str):
+    if completion_model.observe(kind, doc_id, text) and not _compaction["queued"]:
+        _compaction["queued"] = True
+        jobs.enqueue(compact_completion_model)
+
+def _question_text(q):
+    return f"{q.get('title', '')}\n{q.get('description', '')}"
+
+# (collection, kind, projection, text of a document)
+SOURCES = [
+    ("questions", "question", {"title": 1, "description": 1}, _question_text),
+    ("answers", "answer", {"content": 1}, lambda a: a.get("content", "")),
+]
+
+async def load_completion_model():
+    # Load the last compacted model and replay what was posted since; the
+    # replay only feeds this worker's delta
+    await asyncio.to_thread(completion_model.load)
+    for collection, kind, projection, text_of in SOURCES:
+        replayed = 0
+        async for doc in documents_after(
+            collection, projection, completion_model.marks.get(kind), COMPLETION_CATCHUP_LIMIT
+        ):
+            observe_text(kind, str(doc["_id"]), text_of(doc))
+            replayed += 1
+        if replayed == COMPLETION_CATCHUP_LIMIT:
+            print(f"Warning: completion model is far behind on {collection}; run `python completion.py build`")
+
+async def rebuild(batch_size: int = 100_000):
+    # Full offline rebuild from every question and answer
+    if os.path.exists(completion_model.path):
+        shutil.rmtree(completion_model.path)
+    completion_model.load()
+    while True:
+        merged = await completion_model.compact(batch_size)
+        if not merged:
+            break
+        print(f"Merged {merged} posts")
+    print(f"Completion model has {len(completion_model._base['vocab']) if completion_model._base else 0} words")
+
+if __name__ == "__main__":
+    run_command("completion.py", "build", rebuild)
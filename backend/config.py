@@ -0,0 +1,12 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# On-disk state shared by the AI modules: embedding indexes, the completion
+# model and exported ONNX graphs
+AI_INDEX_DIR = os.getenv("AI_INDEX_DIR", "data")
+AI_ONNX_DIR = os.getenv("AI_ONNX_DIR", os.path.join(AI_INDEX_DIR, "onnx"))
+TAG_INDEX_PATH = os.path.join(AI_INDEX_DIR, "tags")
+QUESTION_INDEX_PATH = os.path.join(AI_INDEX_DIR, "questions")
+COMPLETION_DIR = os.path.join(AI_INDEX_DIR, "completion")
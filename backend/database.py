@@ -1,11 +1,129 @@
+import asyncio
 import os
-from pymongo import MongoClient
+import sys
+from bson import ObjectId
+from pymongo import AsyncMongoClient, WriteConcern
+from pymongo.read_preferences import ReadPreference, SecondaryPreferred
 from dotenv import load_dotenv
+from metrics import mongo_listeners
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME")
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# Connection pool, timeouts and wire compression. zstd/snappy need the
+# pymongo[zstd]/pymongo[snappy] extras; zlib is always available.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+
+# Writes wait for a majority of the replica set. Read-only routes use
+# `read_db`, which prefers secondaries that are at most
+# MONGO_MAX_STALENESS_SECONDS behind (90 is the server's minimum; -1 = no
+# bound). MONGO_READ_FROM_SECONDARIES=0 sends everything to the primary.
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "majority")
+MONGO_WRITE_TIMEOUT_MS = int(os.getenv("MONGO_WRITE_TIMEOUT_MS", "5000"))
+MONGO_READ_FROM_SECONDARIES = os.getenv("MONGO_READ_FROM_SECONDARIES", "1") == "1"
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "90"))
+
+client = None
+_databases = {}
+# Multi-document transactions need a replica set or mongos; a standalone
+# server falls back to separate writes where callers handle that
+supports_transactions = False
+
+def _write_concern():
+    w = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    return WriteConcern(w=w, wtimeout=MONGO_WRITE_TIMEOUT_MS)
+
+def _read_preference():
+    if not MONGO_READ_FROM_SECONDARIES:
+        return ReadPreference.PRIMARY
+    return SecondaryPreferred(max_staleness=MONGO_MAX_STALENESS_SECONDS)
+
+async def connect():
+    global client, supports_transactions
+    client = AsyncMongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        compressors=MONGO_COMPRESSORS,
+        event_listeners=mongo_listeners(),
+    )
+    await client.aconnect()
+    _databases["primary"] = client.get_database(DB_NAME, write_concern=_write_concern())
+    _databases["read"] = client.get_database(DB_NAME, read_preference=_read_preference())
+    hello = await client.admin.command("hello")
+    supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+
+async def run_in_transaction(callback):
+    # callback(session) is retried on transient errors and committed with the
+    # primary database's write concern
+    async with client.start_session() as session:
+        return await session.with_transaction(callback, write_concern=_write_concern())
+
+async def close():
+    global client
+    _databases.clear()
+    if client is not None:
+        await client.close()
+        client = None
+
+class _Database:
+    # Routers import `db` at module load, before the app lifespan has opened
+    # the client, so resolve the real database on each attribute access.
+    def __init__(self, role: str):
+        self._role = role
+
+    def __getattr__(self, name):
+        database = _databases.get(self._role)
+        if database is None:
+            raise RuntimeError("Database client is not connected")
+        return getattr(database, name)
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+db = _Database("primary")
+# Possibly-stale reads for GET routes; never read-modify-write through this
+read_db = _Database("read")
+
+async def documents_after(collection: str, projection, last_id=None, limit=None, until=None):
+    # Documents in _id order after last_id (and up to until), for building
+    # derived data
+    query = {}
+    if last_id:
+        query.setdefault("_id", {})["$gt"] = ObjectId(last_id)
+    if until:
+        query.setdefault("_id", {})["$lte"] = until
+    cursor = db[collection].find(query, projection).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    async for doc in cursor:
+        yield doc
+
+def run_command(script: str, command: str, job):
+    # `python <script> <command>` maintenance entry point: runs job() with
+    # the database connected
+    if sys.argv[1:] != [command]:
+        sys.exit(f"usage: python {script} {command}")
+
+    async def main():
+        await connect()
+        try:
+            await job()
+        finally:
+            await close()
+
+    asyncio.run(main())
@@ -1,30 +1,47 @@
+import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from auth import decode_access_token
+from cache import TTLCache
 from database import db
 from bson import ObjectId
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+# Resolved user records by user id, so authenticated requests skip the users lookup
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+def invalidate_principal(user_id):
+    # Call whenever a user document changes (rename, demotion, deletion)
+    principal_cache.pop(str(user_id))
+
+async def get_principal(token: str = Depends(oauth2_scheme)):
     try:
         payload = decode_access_token(token)
-        user = db.users.find_one({"_id": ObjectId(payload["user_id"])})
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        return {"user_id": str(user["_id"]), "username": user["username"]}
+        user_id = payload["user_id"]
+        user = principal_cache.get(user_id)
+        if user is None:
+            user = await db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="Invalid credentials")
+            principal_cache.set(user_id, user)
+        # Callers get their own copy; the cached record is shared across requests
+        return dict(user)
     except:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def get_current_admin(user=Depends(get_current_user)):
-    user_record = db.users.find_one({"_id": ObjectId(user["user_id"])})
-    
-    if not user_record:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if not user_record.get("is_admin", False):
+async def get_current_user(user=Depends(get_principal)):
+    return {"user_id": str(user["_id"]), "username": user["username"]}
+
+
+async def get_current_admin(user_record=Depends(get_principal)):
+    # The role is read fresh: invalidate_principal only clears this worker's
+    # cache, and a demotion must not wait for the TTL on the others
+    current = await db.users.find_one({"_id": user_record["_id"]}, {"is_admin": 1})
+    if not current or not current.get("is_admin", False):
         raise HTTPException(status_code=403, detail="Admin access required")
-    
+    user_record["is_admin"] = True
     return user_record
-
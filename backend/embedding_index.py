@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import numpy as np
+from file_lock import file_lock
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _top_k(scores, k: int):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+class EmbeddingIndex:
+    # Keys plus an L2-normalized float32 matrix. On disk the matrix is a raw
+    # append-only <path>.vectors.f32 file (memory-mapped on load) next to
+    # <path>.keys.txt, one key per line. New rows are buffered in memory and
+    # appended once flush_every of them have accumulated (or on save()), so
+    # adding never rewrites or re-embeds what is already indexed. stamp
+    # identifies what produced the vectors; an index saved with a different
+    # stamp is discarded on load so it gets rebuilt.
+    #
+    # Several worker processes may share the files: appends hold an flock on
+    # <path>.lock, and every process maps row i to line i of the keys file as
+    # it is on disk, so rows appended by other workers line up with their keys.
+    def __init__(self, path: str, flush_every: int = 256, dedupe: bool = True, stamp=None):
+        self.keys_path = path + ".keys.txt"
+        self.vectors_path = path + ".vectors.f32"
+        self.meta_path = path + ".meta.json"
+        self.lock_path = path + ".lock"
+        self.flush_every = flush_every
+        self.dedupe = dedupe
+        self.stamp = stamp
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._dim = None
+        self._keys = []
+        self._keys_offset = 0  # bytes of the keys file read into _keys
+        self._vectors = None
+        self._new_keys = []
+        self._new_vectors = []
+        self._known = set()
+        self._ivf = None
+
+    def load(self):
+        with self._lock, file_lock(self.lock_path):
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path) as f:
+                    meta = json.load(f)
+                if meta.get("stamp") != self.stamp:
+                    print(f"Warning: {self.meta_path} was built by {meta.get('stamp')}, not {self.stamp}; rebuilding")
+                    for path in (self.keys_path, self.vectors_path, self.meta_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+            self._reset()
+            self._sync()
+        return self
+
+    def _sync(self):
+        # Reads rows appended since the last call, by this or any other
+        # process. A crash between the two appends can leave one file longer
+        # than the other; only rows present in both count.
+        if self._dim is None:
+            if not os.path.exists(self.meta_path):
+                return
+            with open(self.meta_path) as f:
+                self._dim = json.load(f)["dim"]
+        rows = os.path.getsize(self.vectors_path) // (self._dim * 4) if os.path.exists(self.vectors_path) else 0
+        if rows > len(self._keys) and os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as f:
+                f.seek(self._keys_offset)
+                lines = f.read().split(b"\n")[:-1][:rows - len(self._keys)]
+            keys = [line.decode("utf-8") for line in lines]
+            self._keys_offset += sum(len(line) + 1 for line in lines)
+            self._keys = self._keys + keys
+            if self.dedupe:
+                self._known.update(keys)
+        rows = len(self._keys)
+        self._vectors = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+            if rows else None
+        )
+
+    def refresh(self):
+        # Picks up rows other workers have saved; cheap when there are none
+        with self._lock:
+            if os.path.exists(self.keys_path) and os.path.getsize(self.keys_path) == self._keys_offset:
+                return
+            with file_lock(self.lock_path, shared=True):
+                self._sync()
+
+    def __len__(self):
+        return len(self._keys) + len(self._new_keys)
+
+    def __contains__(self, key):
+        return key in self._known
+
+    def last_key(self):
+        # Key of the last saved row
+        with self._lock:
+            return self._keys[-1] if self._keys else None
+
+    def add(self, keys, vectors):
+        vectors = normalize(vectors)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                key = str(key).replace("\n", " ")
+                if self.dedupe:
+                    if key in self._known:
+                        continue
+                    self._known.add(key)
+                self._new_keys.append(key)
+                self._new_vectors.append(vector)
+            flush = len(self._new_keys) >= self.flush_every
+        if flush:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._new_keys:
+                return
+            with file_lock(self.lock_path):
+                self._sync()
+                new_keys, new_vectors = self._new_keys, self._new_vectors
+                if self.dedupe:
+                    # Another worker may have saved some of the same keys
+                    saved = set(self._keys)
+                    kept = [i for i, key in enumerate(new_keys) if key not in saved]
+                    new_keys = [new_keys[i] for i in kept]
+                    new_vectors = [new_vectors[i] for i in kept]
+                if new_keys:
+                    self._append(new_keys, np.stack(new_vectors))
+                self._new_keys = []
+                self._new_vectors = []
+                self._sync()
+
+    def _append(self, keys, vectors):
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            os.makedirs(os.path.dirname(self.meta_path) or ".", exist_ok=True)
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": self._dim, "stamp": self.stamp}, f)
+        # Cut both files back to the rows _sync() counted, dropping whatever a
+        # crashed append left behind, so new rows and keys start level
+        if os.path.exists(self.vectors_path):
+            os.truncate(self.vectors_path, len(self._keys) * self._dim * 4)
+        if os.path.exists(self.keys_path):
+            os.truncate(self.keys_path, self._keys_offset)
+        # Vectors first: a key never points past the end of the matrix
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.keys_path, "a", encoding="utf-8") as f:
+            f.write("".join(key + "\n" for key in keys))
+
+    def _snapshot(self):
+        # The persisted rows stay memory-mapped; only the unflushed tail is copied
+        with self._lock:
+            new_keys = list(self._new_keys)
+            new_vectors = np.stack(self._new_vectors) if self._new_vectors else None
+            return self._keys, self._vectors, new_keys, new_vectors, self._ivf
+
+    def build_ivf(self, n_lists: int, iterations: int = 10, sample_size: int = 100_000, seed: int = 0):
+        # Spherical k-means over a sample of the persisted rows, then an inverted
+        # list per centroid. Rows persisted later are brute-forced until the next
+        # build.
+        with self._lock:
+            vectors = self._vectors
+        if vectors is None or len(vectors) < n_lists:
+            return
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+        sample = np.asarray(vectors[sample_rows])
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize(centroids)
+
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            chunk = np.asarray(vectors[start:start + 65536])
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        with self._lock:
+            self._ivf = (centroids, order, offsets, len(vectors))
+
+    def search(self, query, k: int, n_probe: int = None):
+        # Cosine similarity; returns [(key, score)] best first. With an IVF
+        # built and n_probe set, only the n_probe nearest lists are scanned.
+        keys, vectors, new_keys, new_vectors, ivf = self._snapshot()
+        query = normalize(query)[0]
+        rows, scores = [], []
+        if vectors is not None:
+            if ivf is not None and n_probe:
+                centroids, order, offsets, covered = ivf
+                lists = _top_k(centroids @ query, n_probe)
+                candidates = np.concatenate(
+                    [order[offsets[l]:offsets[l + 1]] for l in lists]
+                    + [np.arange(covered, len(vectors))]
+                )
+                candidates.sort()
+                rows.append(candidates)
+                scores.append(np.asarray(vectors[candidates]) @ query)
+            else:
+                rows.append(np.arange(len(vectors)))
+                scores.append(vectors @ query)
+        base = len(keys)
+        if new_vectors is not None:
+            rows.append(np.arange(base, base + len(new_keys)))
+            scores.append(new_vectors @ query)
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        return [
+            (keys[r] if r < base else new_keys[r - base], float(scores[i]))
+            for i, r in ((i, int(rows[i])) for i in _top_k(scores, k))
+        ]
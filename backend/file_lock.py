@@ -0,0 +1,21 @@
+import os
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single worker
+    fcntl = None
+
+@contextmanager
+def file_lock(path: str, shared: bool = False, blocking: bool = True):
+    # flock on path, held for the with block. Yields False instead of waiting
+    # when blocking is off and another process holds the lock.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(f, mode if blocking else mode | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
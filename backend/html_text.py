@@ -0,0 +1,14 @@
+import html
+import re
+
+_TAGS = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+
+def plain_text(markup: str):
+    # Rich-text HTML from the editor as the reader sees it: no tags, entities
+    # decoded, whitespace collapsed. Escape again before sending it as HTML.
+    return _SPACE.sub(" ", html.unescape(_TAGS.sub(" ", markup or ""))).strip()
+
+def preview(markup: str, length: int):
+    text = plain_text(markup)
+    return text if len(text) <= length else text[:length].rstrip() + "…"
@@ -0,0 +1,154 @@
+import asyncio
+import sys
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+import database
+from database import db
+
+# Every index the routers rely on, per collection. create_indexes is a no-op
+# for indexes that already exist with the same spec, so this is safe to run on
+# every startup.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+    "questions": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="feed_newest"),
+        IndexModel([("votes", DESCENDING), ("_id", DESCENDING)], name="feed_votes"),
+        IndexModel(
+            [("answer_count", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="feed_unanswered",
+        ),
+        IndexModel(
+            [("tags", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="feed_tag",
+        ),
+        IndexModel(
+            [("tags", ASCENDING), ("votes", DESCENDING), ("_id", DESCENDING)],
+            name="feed_tag_votes",
+        ),
+        IndexModel(
+            [("title", TEXT), ("tags", TEXT), ("description", TEXT)],
+            name="search_text",
+            weights={"title": 10, "tags": 5, "description": 1},
+        ),
+    ],
+    "answers": [
+        IndexModel([("question_id", ASCENDING)], name="question_id"),
+        IndexModel([("content", TEXT)], name="search_text"),
+    ],
+    "notifications": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_feed"),
+        IndexModel(
+            [("user_id", ASCENDING), ("read", ASCENDING), ("created_at", DESCENDING)],
+            name="user_unread",
+        ),
+        IndexModel([("link", ASCENDING)], name="link"),
+        IndexModel([("answer_id", ASCENDING)], name="answer_id", sparse=True),
+        # Lets retried fan-out jobs skip notifications they already wrote
+        IndexModel(
+            [("user_id", ASCENDING), ("answer_id", ASCENDING), ("type", ASCENDING)],
+            name="answer_event_unique",
+            unique=True,
+            partialFilterExpression={"answer_id": {"$exists": True}},
+        ),
+    ],
+    "votes": [
+        IndexModel(
+            [("target_type", ASCENDING), ("target_id", ASCENDING), ("user_id", ASCENDING)],
+            name="target_user_unique",
+            unique=True,
+        ),
+    ],
+    "flags": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="newest"),
+        IndexModel([("type", ASCENDING), ("item_id", ASCENDING)], name="item"),
+    ],
+    "tag_stats": [
+        IndexModel([("question_count", DESCENDING), ("_id", DESCENDING)], name="popular"),
+        IndexModel([("last_activity_at", DESCENDING), ("_id", DESCENDING)], name="recent"),
+    ],
+    "moderation_queue": [
+        IndexModel([("count", DESCENDING), ("_id", DESCENDING)], name="severity"),
+        IndexModel([("latest_flag_at", DESCENDING), ("_id", DESCENDING)], name="recent"),
+    ],
+}
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        await db[collection].create_indexes(indexes)
+
+# (collection, filter, sort) for every query the routers issue
+_sample_id = str(ObjectId())
+QUERY_SHAPES = [
+    ("users", {"email": "someone@example.com"}, None),
+    ("users", {"username": "someone"}, None),
+    ("users", {"username": {"$in": ["someone", "someone_else"]}}, None),
+    ("questions", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("questions", {}, [("votes", DESCENDING), ("_id", DESCENDING)]),
+    ("questions", {"answer_count": 0}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("questions", {"tags": "python"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("questions", {"tags": "python"}, [("votes", DESCENDING), ("_id", DESCENDING)]),
+    ("answers", {"question_id": _sample_id}, None),
+    ("notifications", {"user_id": _sample_id}, [("created_at", DESCENDING)]),
+    ("notifications", {"user_id": _sample_id, "read": False}, [("created_at", DESCENDING)]),
+    ("notifications", {"user_id": _sample_id, "read": False}, None),
+    ("votes", {"target_type": "question", "target_id": _sample_id, "user_id": _sample_id}, None),
+    ("votes", {"target_type": "question", "target_id": {"$in": [_sample_id]}}, None),
+    ("flags", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("flags", {"type": "question", "item_id": {"$in": [_sample_id]}}, None),
+    ("moderation_queue", {}, [("count", DESCENDING), ("_id", DESCENDING)]),
+    ("moderation_queue", {}, [("latest_flag_at", DESCENDING), ("_id", DESCENDING)]),
+    ("notifications", {"link": {"$in": [f"/questions/{_sample_id}"]}}, None),
+    ("notifications", {"answer_id": {"$in": [_sample_id]}}, None),
+    ("answers", {"question_id": {"$in": [_sample_id]}}, None),
+    ("tag_stats", {}, [("question_count", DESCENDING), ("_id", DESCENDING)]),
+    ("tag_stats", {}, [("last_activity_at", DESCENDING), ("_id", DESCENDING)]),
+    ("questions", {"tags": "python", "answer_count": 0}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+]
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+async def verify_query_plans():
+    # Returns the query shapes whose winning plan is a collection scan
+    failures = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in set(_plan_stages(winning_plan)):
+            failures.append((collection, query, sort))
+    return failures
+
+async def main(verify: bool):
+    await database.connect()
+    try:
+        await ensure_indexes()
+        print("Indexes ensured")
+        if not verify:
+            return 0
+        failures = await verify_query_plans()
+        for collection, query, sort in failures:
+            print(f"COLLSCAN: {collection} find({query}) sort({sort})")
+        if failures:
+            return 1
+        print(f"All {len(QUERY_SHAPES)} query shapes are index-backed")
+        return 0
+    finally:
+        await database.close()
+
+if __name__ == "__main__":
+    # python indexes.py          -> create indexes
+    # python indexes.py verify   -> create indexes, then fail on any COLLSCAN
+    sys.exit(asyncio.run(main(sys.argv[1:] == ["verify"])))
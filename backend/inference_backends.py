@@ -0,0 +1,198 @@
+import os
+import statistics
+import sys
+import time
+from functools import lru_cache
+from config import AI_ONNX_DIR
+
+# How each model is run on CPU:
+#   torch      fp32 PyTorch eager (the reference)
+#   quantized  PyTorch with Linear layers dynamically quantized to int8
+#   onnx       ONNX Runtime; exported once with optimum and cached on disk.
+#              Needs `pip install optimum[onnxruntime]`; falls back to torch
+#              when it is missing.
+# AI_INFERENCE_BACKEND sets the default; AI_INFERENCE_BACKENDS overrides it per
+# model, e.g. "minilm=onnx,t5=quantized". Embeddings shift slightly between
+# backends, so the tag and question indexes record the minilm backend they were
+# built with and are rebuilt at startup when it changes.
+AI_INFERENCE_BACKEND = os.getenv("AI_INFERENCE_BACKEND", "torch")
+AI_INFERENCE_BACKENDS = dict(
+    item.split("=", 1) for item in os.getenv("AI_INFERENCE_BACKENDS", "").split(",") if "=" in item
+)
+BACKENDS = ("torch", "quantized", "onnx")
+
+# name -> (kind, Hugging Face model id)
+MODELS = {
+    "minilm": ("encoder", "sentence-transformers/all-MiniLM-L6-v2"),
+    "bart": ("summarizer", "facebook/bart-large-cnn"),
+    "t5": ("summarizer", "t5-small"),
+}
+
+def backend_for(name: str):
+    backend = AI_INFERENCE_BACKENDS.get(name, AI_INFERENCE_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' for {name}; use one of {', '.join(BACKENDS)}")
+    return backend
+
+def _quantize(model):
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _onnx_model(name: str, model_id: str, ort_class):
+    # Export on first use; later loads read the cached ONNX graph
+    path = os.path.join(AI_ONNX_DIR, name)
+    if os.path.exists(os.path.join(path, "config.json")):
+        return ort_class.from_pretrained(path)
+    model = ort_class.from_pretrained(model_id, export=True)
+    model.save_pretrained(path)
+    return model
+
+def _load_encoder(name: str, model_id: str, backend: str):
+    from transformers import AutoTokenizer, AutoModel
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        return tokenizer, _onnx_model(name, model_id, ORTModelForFeatureExtraction)
+    model = AutoModel.from_pretrained(model_id).eval()
+    return tokenizer, _quantize(model) if backend == "quantized" else model
+
+def _load_summarizer(name: str, model_id: str, backend: str):
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
+    if backend == "torch":
+        return pipeline("summarization", model=model_id)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        model = _onnx_model(name, model_id, ORTModelForSeq2SeqLM)
+    else:
+        model = _quantize(AutoModelForSeq2SeqLM.from_pretrained(model_id).eval())
+    return pipeline("summarization", model=model, tokenizer=tokenizer)
+
+@lru_cache(maxsize=None)
+def onnx_available():
+    try:
+        import optimum.onnxruntime  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def effective_backend(name: str, backend: str = None):
+    # The backend a model actually runs on once the onnx fallback is applied
+    backend = backend or backend_for(name)
+    return "torch" if backend == "onnx" and not onnx_available() else backend
+
+def encoder_stamp():
+    # Stored with each embedding index; vectors from another encoder or
+    # backend are not comparable with new ones
+    return {"model": MODELS["minilm"][1], "backend": effective_backend("minilm")}
+
+def load_model(name: str, backend: str = None):
+    kind, model_id = MODELS[name]
+    requested = backend or backend_for(name)
+    backend = effective_backend(name, requested)
+    if backend != requested:
+        print(f"Warning: optimum[onnxruntime] is not installed; loading {name} with torch")
+    loader = _load_encoder if kind == "encoder" else _load_summarizer
+    return loader(name, model_id, backend)
+
+# Accuracy-vs-latency comparison of every backend against torch fp32:
+#   python inference_backends.py compare [minilm bart t5]
+
+SAMPLE_TEXTS = [
+    "How do I refresh a JWT access token in a FastAPI app without logging the user out?",
+    "My React component re-renders on every keystroke even though I wrapped it in useMemo. "
+    "The parent passes an inline callback and a new object literal as props on each render.",
+    "MongoDB aggregation with $lookup is slow on a collection of ten million documents. "
+    "I added an index on the foreign field but explain() still shows a collection scan on the "
+    "joined collection, and the pipeline spends most of its time in the $unwind stage.",
+    "What is the difference between a process pool and a thread pool in Python for CPU-bound "
+    "work like password hashing, and how does the GIL affect each of them?",
+    "Next.js server components cannot use hooks. How should I share authentication state between "
+    "server and client components when the token lives in an httpOnly cookie?",
+    "Docker build cache is invalidated every time I change a single source file, so pip reinstalls "
+    "all dependencies. How do I order the Dockerfile so dependency layers are reused?",
+]
+
+def _embed(model, texts):
+    import torch
+    tokenizer, encoder = model
+    inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding=True)
+    with torch.no_grad():
+        return encoder(**inputs).last_hidden_state[:, 0, :].numpy()
+
+def _summarize(model, texts):
+    from routes.ai import SUMMARY_PARAMS
+    return [r["summary_text"] for r in model(texts, batch_size=len(texts), **SUMMARY_PARAMS)]
+
+def _cosine_rows(a, b):
+    import numpy as np
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+def _lcs_f1(candidate: str, reference: str):
+    # ROUGE-L F1 on whitespace tokens
+    c, r = candidate.lower().split(), reference.lower().split()
+    if not c or not r:
+        return float(c == r)
+    previous = [0] * (len(r) + 1)
+    for token in c:
+        current = [0]
+        for j, ref_token in enumerate(r):
+            current.append(previous[j] + 1 if token == ref_token else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+    if not lcs:
+        return 0.0
+    precision, recall = lcs / len(c), lcs / len(r)
+    return 2 * precision * recall / (precision + recall)
+
+def compare(names, repeats: int = 5):
+    import gc
+    from model_registry import _rss_bytes
+    rows = []
+    for name in names:
+        kind, _ = MODELS[name]
+        run = _embed if kind == "encoder" else _summarize
+        reference = None
+        for backend in BACKENDS:
+            if backend == "onnx" and not onnx_available():
+                print(f"{name}/onnx: skipped, optimum[onnxruntime] is not installed")
+                continue
+            # RSS growth while loading; earlier backends are freed first
+            gc.collect()
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            model = load_model(name, backend)
+            load_seconds = time.perf_counter() - start
+            rss_mb = max(_rss_bytes() - rss_before, 0) / (1024 * 1024)
+
+            output = run(model, SAMPLE_TEXTS[:1])  # warm-up
+            latencies = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                output = run(model, SAMPLE_TEXTS)
+                latencies.append((time.perf_counter() - start) * 1000)
+            if backend == "torch":
+                reference = output
+
+            if kind == "encoder":
+                similarity = _cosine_rows(output, reference)
+                accuracy = f"cosine vs fp32 mean {similarity.mean():.4f} min {similarity.min():.4f}"
+            else:
+                scores = [_lcs_f1(o, r) for o, r in zip(output, reference)]
+                accuracy = f"ROUGE-L vs fp32 mean {statistics.fmean(scores):.3f} min {min(scores):.3f}"
+            rows.append((name, backend, statistics.median(latencies), load_seconds, rss_mb, accuracy))
+            del model
+            gc.collect()
+
+    baseline = {name: ms for name, backend, ms, *_ in rows if backend == "torch"}
+    print(f"{'model':8} {'backend':10} {'batch ms':>9} {'speedup':>8} {'load s':>7} {'rss MB':>7}  accuracy")
+    for name, backend, ms, load_seconds, rss_mb, accuracy in rows:
+        speedup = baseline[name] / ms if name in baseline else float("nan")
+        print(f"{name:8} {backend:10} {ms:9.1f} {speedup:7.2f}x {load_seconds:7.1f} {rss_mb:7.0f}  {accuracy}")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["compare"] or not set(sys.argv[2:]) <= set(MODELS):
+        sys.exit(f"usage: python inference_backends.py compare [{' '.join(MODELS)}]")
+    compare(sys.argv[2:] or list(MODELS))
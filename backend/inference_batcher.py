@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from metrics import inference_duration, record_span
+
+class MicroBatcher:
+    # Coalesces concurrent single-item calls into one batch_fn(items) call.
+    # A batch is dispatched once max_batch_size items are waiting or max_wait_ms
+    # has passed since the first one arrived, whichever comes first. batch_fn
+    # must return one result per item, in order.
+    def __init__(self, name: str, batch_fn, max_batch_size: int = 8, max_wait_ms: float = 10):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._sizes = deque(maxlen=1000)
+        self._latencies_ms = deque(maxlen=1000)
+
+    def submit(self, item):
+        self._ensure_worker()
+        future = Future()
+        start = time.perf_counter()
+        self._queue.put((item, future))
+        try:
+            return future.result()
+        finally:
+            record_span("inference", time.perf_counter() - start)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name=f"batcher-{self.name}", daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(batch):
+                    # Results can't be matched to items, so fail every caller
+                    # rather than hand out misaligned results or leave some waiting
+                    raise RuntimeError(
+                        f"{self.name} batch_fn returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self._record(len(batch), (time.perf_counter() - start) * 1000)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _record(self, size: int, latency_ms: float):
+        inference_duration.observe(latency_ms / 1000, self.name)
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._sizes.append(size)
+            self._latencies_ms.append(latency_ms)
+
+    def stats(self):
+        with self._stats_lock:
+            sizes = list(self._sizes)
+            latencies = sorted(self._latencies_ms)
+            batches, items = self._batches, self._items
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(int(p * len(latencies)), len(latencies) - 1)], 2)
+
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": batches,
+            "items": items,
+            "queued": self._queue.qsize(),
+            "mean_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else None,
+            "max_batch_size_seen": max(sizes) if sizes else None,
+            "batch_latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import traceback
+
+# In-process background job queue for work that must not delay a response.
+# Failed jobs are retried with exponential backoff; jobs should be idempotent.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "0.5"))
+JOB_SHUTDOWN_GRACE_SECONDS = float(os.getenv("JOB_SHUTDOWN_GRACE_SECONDS", "10"))
+
+_queue = None
+_workers = []
+_retries = set()
+
+def enqueue(fn, *args):
+    if _queue is None:
+        raise RuntimeError("Job queue is not running")
+    _queue.put_nowait((fn, args, 1))
+
+async def _retry_later(job, delay: float):
+    try:
+        await asyncio.sleep(delay)
+        _queue.put_nowait(job)
+    finally:
+        _retries.discard(asyncio.current_task())
+
+async def _worker():
+    while True:
+        fn, args, attempt = await _queue.get()
+        try:
+            await fn(*args)
+        except Exception as e:
+            if attempt < JOB_MAX_ATTEMPTS:
+                delay = JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+                print(f"Warning: job {fn.__name__} failed (attempt {attempt}), retrying in {delay}s: {e}")
+                _retries.add(asyncio.create_task(_retry_later((fn, args, attempt + 1), delay)))
+            else:
+                print(f"Error: job {fn.__name__} failed after {attempt} attempts: {e}")
+                traceback.print_exc()
+        finally:
+            _queue.task_done()
+
+async def start():
+    global _queue
+    _queue = asyncio.Queue()
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(JOB_WORKERS))
+
+async def stop():
+    # Give queued jobs a chance to finish, then stop the workers
+    global _queue
+    if _queue is None:
+        return
+    try:
+        await asyncio.wait_for(_queue.join(), JOB_SHUTDOWN_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        print(f"Warning: dropping {_queue.qsize()} unfinished background jobs")
+    for task in [*_workers, *_retries]:
+        task.cancel()
+    await asyncio.gather(*_workers, *_retries, return_exceptions=True)
+    _workers.clear()
+    _retries.clear()
+    _queue = None
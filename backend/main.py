@@ -1,8 +1,48 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from routes import questions, answers, auth, notifications, admin, flags, ai  # Import AI router
+import database
+import jobs
+import notification_hub
+from metrics import MetricsMiddleware
+from auth import shutdown_password_pool
+from completion import completion_model, load_completion_model
+from indexes import ensure_indexes
+from moderation import build_moderation_queue
+from pagination import NEXT_CURSOR_HEADER
+from question_index import load_question_index, question_index
+from tag_stats import build_tag_stats
+from tag_index import load_tag_index, tag_index
+from votes import migrate_legacy_voters
+from routes import questions, answers, auth, notifications, admin, flags, ai, search, metrics, export, tags  # Import AI router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.connect()
+    await jobs.start()
+    await notification_hub.start()
+    await ensure_indexes()
+    await questions.backfill_answer_counts()
+    await questions.backfill_previews()
+    await migrate_legacy_voters()
+    await build_moderation_queue()
+    await build_tag_stats()
+    await load_tag_index()
+    await load_question_index()
+    await load_completion_model()
+    if ai.AI_WARM_MODELS:
+        await run_in_threadpool(ai.registry.warm, ai.AI_WARM_MODELS)
+    yield
+    await jobs.stop()
+    await notification_hub.stop()
+    tag_index.save()
+    question_index.save()
+    await completion_model.compact()
+    shutdown_password_pool()
+    await database.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -11,7 +51,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(questions.router)
@@ -20,3 +62,7 @@ app.include_router(notifications.router)
 app.include_router(admin.router)
 app.include_router(flags.router)
 app.include_router(ai.router)  # Register AI routes
+app.include_router(search.router)
+app.include_router(metrics.router)
+app.include_router(export.router)
+app.include_router(tags.router)
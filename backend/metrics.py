@@ -0,0 +1,276 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Route latency, DB command and inference histograms are always kept (a few
+# dict updates per request). Per-request tracing - query counts, N+1
+# detection and Server-Timing headers - only runs for the sampled fraction.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "0"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+# The same command on the same collection issued more often than this in one
+# request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for label_values, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                labels = _label_text(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class CounterMetric:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = Counter()
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+class Gauge(CounterMetric):
+    type = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+db_command_duration = Histogram(
+    "db_command_duration_seconds", "MongoDB command round trip time", ("command",)
+)
+db_commands_per_request = Histogram(
+    "db_commands_per_request", "MongoDB commands issued by a sampled request", ("route",), COUNT_BUCKETS
+)
+db_time_per_request = Histogram(
+    "db_time_per_request_seconds", "MongoDB time spent by a sampled request", ("route",)
+)
+n_plus_one_total = CounterMetric(
+    "db_n_plus_one_total", "Sampled requests repeating one command past the N+1 threshold",
+    ("route", "command", "collection"),
+)
+inference_duration = Histogram(
+    "inference_batch_duration_seconds", "Model inference time per batch", ("model",)
+)
+model_load_duration = Histogram(
+    "model_load_duration_seconds", "Time to load a model into memory", ("model",)
+)
+pool_checkout_wait = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("address", "outcome")
+)
+pool_connections_open = Gauge("mongo_pool_connections_open", "Open pooled connections", ("address",))
+pool_connections_in_use = Gauge("mongo_pool_connections_in_use", "Checked-out pooled connections", ("address",))
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time including queueing", ("operation",)
+)
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestTrace:
+    def __init__(self):
+        self.db_commands = Counter()
+        self.db_seconds = 0.0
+        self.spans = {}
+
+    def add_span(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def server_timing(self, total_seconds: float):
+        entries = [f'db;dur={self.db_seconds * 1000:.1f};desc="{sum(self.db_commands.values())} queries"']
+        entries += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items()]
+        entries.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+    def finish(self, route: str):
+        db_commands_per_request.observe(sum(self.db_commands.values()), route)
+        db_time_per_request.observe(self.db_seconds, route)
+        for (command, collection), count in self.db_commands.items():
+            if count > N_PLUS_ONE_THRESHOLD:
+                n_plus_one_total.inc(route, command, collection)
+                print(f"Warning: possible N+1 in {route}: {count}x {command} on {collection}")
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+def record_span(name: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, seconds)
+
+@contextmanager
+def span(name: str):
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, time.perf_counter() - start)
+
+class CommandMetrics(monitoring.CommandListener):
+    # Async pymongo publishes command events from the task that issued the
+    # command, so the request's trace is visible through the context var
+    def started(self, event):
+        trace = _current_trace.get()
+        if trace is not None:
+            collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+            trace.db_commands[(event.command_name, collection if isinstance(collection, str) else "")] += 1
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        seconds = event.duration_micros / 1_000_000
+        db_command_duration.observe(seconds, event.command_name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.db_seconds += seconds
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    # Checkout wait is the time a request spends queued for a free connection;
+    # it climbs when MONGO_MAX_POOL_SIZE is too small for the load
+    def connection_checked_out(self, event):
+        address = "%s:%s" % event.address
+        pool_checkout_wait.observe(event.duration or 0.0, address, "ok")
+        pool_connections_in_use.inc(address)
+        record_span("db_pool_wait", event.duration or 0.0)
+
+    def connection_check_out_failed(self, event):
+        pool_checkout_wait.observe(event.duration or 0.0, "%s:%s" % event.address, event.reason)
+
+    def connection_checked_in(self, event):
+        pool_connections_in_use.dec("%s:%s" % event.address)
+
+    def connection_created(self, event):
+        pool_connections_open.inc("%s:%s" % event.address)
+
+    def connection_closed(self, event):
+        pool_connections_open.dec("%s:%s" % event.address)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+def mongo_listeners():
+    return [CommandMetrics(), PoolMetrics()] if METRICS_ENABLED else []
+
+class MetricsMiddleware:
+    # Plain ASGI middleware so streaming responses (SSE) pass through untouched
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace() if METRICS_SAMPLE_RATE and random.random() < METRICS_SAMPLE_RATE else None
+        token = _current_trace.set(trace) if trace is not None else None
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None and SERVER_TIMING:
+                    timing = trace.server_timing(time.perf_counter() - start)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timing.encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # The router records the matched route on the scope; use its path
+            # template so /questions/{id} is one series, not one per question
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route, str(status))
+            if trace is not None:
+                _current_trace.reset(token)
+                trace.finish(route)
@@ -0,0 +1,108 @@
+import gc
+import os
+import threading
+import time
+from metrics import model_load_duration, record_span
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is a high-water mark in KiB; the best we can do off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class _Entry:
+    def __init__(self, loader):
+        self.loader = loader
+        self.model = None
+        self.lock = threading.Lock()
+        self.load_seconds = None
+        self.rss_bytes = None
+        self.last_used = None
+        self.loads = 0
+
+class ModelRegistry:
+    # Loads models on first use and evicts the least recently used ones once
+    # their combined resident size exceeds memory_budget_mb, or once they have
+    # been idle for idle_seconds. Sizes are the RSS growth observed while each
+    # model was loading.
+    def __init__(self, memory_budget_mb: float = None, idle_seconds: float = None):
+        self.memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self.idle_seconds = idle_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader):
+        self._entries[name] = _Entry(loader)
+
+    def __contains__(self, name: str):
+        return name in self._entries
+
+    def get(self, name: str):
+        entry = self._entries[name]
+        self.evict_idle(keep=name)
+        with entry.lock:
+            if entry.model is None:
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                entry.model = entry.loader()
+                entry.load_seconds = time.perf_counter() - start
+                entry.rss_bytes = max(_rss_bytes() - rss_before, 0)
+                entry.loads += 1
+                model_load_duration.observe(entry.load_seconds, name)
+                record_span("model_load", entry.load_seconds)
+            entry.last_used = time.monotonic()
+            model = entry.model
+        self._enforce_budget(keep=name)
+        return model
+
+    def warm(self, names=None):
+        for name in names or list(self._entries):
+            self.get(name)
+
+    def evict(self, name: str):
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.model is None:
+                return
+            entry.model = None
+        gc.collect()
+
+    def evict_idle(self, keep: str = None):
+        if not self.idle_seconds:
+            return
+        cutoff = time.monotonic() - self.idle_seconds
+        for name, entry in self._entries.items():
+            if name != keep and entry.model is not None and entry.last_used < cutoff:
+                self.evict(name)
+
+    def _enforce_budget(self, keep: str):
+        if not self.memory_budget:
+            return
+        with self._lock:
+            loaded = sorted(
+                (e.last_used, name) for name, e in self._entries.items() if e.model is not None
+            )
+            used = sum(self._entries[name].rss_bytes or 0 for _, name in loaded)
+            for _, name in loaded:
+                if used <= self.memory_budget:
+                    break
+                if name == keep:
+                    continue
+                used -= self._entries[name].rss_bytes or 0
+                self.evict(name)
+
+    def stats(self):
+        return [
+            {
+                "name": name,
+                "loaded": entry.model is not None,
+                "loads": entry.loads,
+                "load_seconds": entry.load_seconds,
+                "rss_mb": round(entry.rss_bytes / (1024 * 1024), 1) if entry.rss_bytes is not None else None,
+                "idle_seconds": round(time.monotonic() - entry.last_used, 1) if entry.last_used else None,
+            }
+            for name, entry in self._entries.items()
+        ]
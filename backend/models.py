@@ -1,5 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from datetime import datetime
+from bson import ObjectId
+from pydantic import BaseModel, BeforeValidator, ConfigDict, EmailStr, Field
+from typing import Annotated, List, Optional
 
 class Question(BaseModel):
     title: str
@@ -21,3 +23,61 @@ class UserLogin(BaseModel):
     
 class Vote(BaseModel):
     direction: str
+
+# Response models. Stored documents may carry fields that predate these
+# models, so unknown fields are passed through rather than dropped.
+def _id_str(value):
+    return str(value) if isinstance(value, ObjectId) else value
+
+# Ids are strings in the API; older documents store some of them as ObjectIds
+IdStr = Annotated[str, BeforeValidator(_id_str)]
+
+class _Document(BaseModel):
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+    id: IdStr = Field(alias="_id")
+
+class QuestionOut(_Document):
+    title: str = ""
+    description: str = ""
+    tags: List[str] = []
+    user_id: Optional[IdStr] = None
+    author: str
+    author_avatar: str
+    votes: int = 0
+    answer_count: int = 0
+    accepted_answer_id: Optional[IdStr] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class AnswerOut(_Document):
+    question_id: IdStr
+    content: str = ""
+    user_id: Optional[IdStr] = None
+    author: str
+    author_avatar: str
+    votes: int = 0
+    is_accepted: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class NotificationOut(_Document):
+    user_id: IdStr
+    message: str = ""
+    link: Optional[str] = None
+    read: bool = False
+    type: Optional[str] = None
+    answer_id: Optional[IdStr] = None
+    created_at: Optional[datetime] = None
+
+class FlagOut(_Document):
+    type: str
+    item_id: IdStr
+    flagged_by: Optional[IdStr] = None
+    created_at: Optional[datetime] = None
+
+class TagStatsOut(BaseModel):
+    tag: str
+    question_count: int = 0
+    answered_count: int = 0
+    answer_count: int = 0
+    last_activity_at: Optional[datetime] = None
@@ -0,0 +1,119 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from database import db
+import notification_hub
+from tag_stats import answers_removed, questions_removed
+from thread_cache import forget_thread_version
+from votes import delete_votes
+
+# Ids are processed in chunks so one bulk request never builds an oversized $in
+BATCH_SIZE = 1000
+
+def _chunks(ids):
+    ids = list(dict.fromkeys(ids))
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+def queue_key(item_type: str, item_id: str):
+    return f"{item_type}:{item_id}"
+
+async def record_flag(item_type: str, item_id: str, user_id: str):
+    # Raw flag row plus its aggregated moderation_queue entry
+    now = datetime.utcnow()
+    await db.flags.insert_one({
+        "type": item_type,
+        "item_id": item_id,
+        "flagged_by": user_id,
+        "created_at": now,
+    })
+    await db.moderation_queue.update_one(
+        {"_id": queue_key(item_type, item_id)},
+        {
+            "$inc": {"count": 1},
+            "$max": {"latest_flag_at": now},
+            "$setOnInsert": {"type": item_type, "item_id": item_id, "first_flag_at": now},
+        },
+        upsert=True,
+    )
+
+async def build_moderation_queue():
+    # One-off migration: aggregate the existing raw flags into moderation_queue
+    if await db.migrations.find_one({"_id": "moderation_queue"}):
+        return
+    await (await db.flags.aggregate([
+        {"$group": {
+            "_id": {"$concat": ["$type", ":", "$item_id"]},
+            "type": {"$first": "$type"},
+            "item_id": {"$first": "$item_id"},
+            "count": {"$sum": 1},
+            "latest_flag_at": {"$max": "$created_at"},
+            "first_flag_at": {"$min": "$created_at"},
+        }},
+        {"$merge": {"into": "moderation_queue", "whenMatched": "replace"}},
+    ])).to_list()
+    await db.migrations.insert_one({"_id": "moderation_queue", "applied_at": datetime.utcnow()})
+
+async def _delete_notifications(query):
+    # Users with unread ones among them need their cached counts redone
+    user_ids = await db.notifications.distinct("user_id", {**query, "read": False})
+    await db.notifications.delete_many(query)
+    await notification_hub.notifications_removed(user_ids)
+
+async def _delete_dependents(item_type: str, item_ids):
+    await db.flags.delete_many({"type": item_type, "item_id": {"$in": item_ids}})
+    await db.moderation_queue.delete_many({"_id": {"$in": [queue_key(item_type, i) for i in item_ids]}})
+    await delete_votes(item_type, item_ids)
+
+async def delete_questions(question_ids):
+    # Questions and everything hanging off them: answers, flags, queue
+    # entries, votes and notifications. Returns (questions, answers) deleted.
+    deleted_questions = deleted_answers = 0
+    for qids in _chunks(q for q in question_ids if ObjectId.is_valid(q)):
+        answer_ids = [
+            str(a["_id"])
+            async for a in db.answers.find({"question_id": {"$in": qids}}, {"_id": 1})
+        ]
+        oids = [ObjectId(q) for q in qids]
+        questions = await db.questions.find({"_id": {"$in": oids}}, {"tags": 1, "answer_count": 1}).to_list()
+        result = await db.questions.delete_many({"_id": {"$in": oids}})
+        deleted_questions += result.deleted_count
+        await questions_removed(questions)
+        result = await db.answers.delete_many({"question_id": {"$in": qids}})
+        deleted_answers += result.deleted_count
+        await _delete_dependents("question", qids)
+        for aids in _chunks(answer_ids):
+            await _delete_dependents("answer", aids)
+        await _delete_notifications({"link": {"$in": [f"/questions/{q}" for q in qids]}})
+        for qid in qids:
+            forget_thread_version(qid)
+    return deleted_questions, deleted_answers
+
+async def delete_answers(answer_ids):
+    # Answers plus their flags, queue entries, votes and notifications;
+    # keeps answer_count on the parent questions in step. Returns the count.
+    deleted = 0
+    for aids in _chunks(a for a in answer_ids if ObjectId.is_valid(a)):
+        oids = [ObjectId(a) for a in aids]
+        per_question = {}
+        async for answer in db.answers.find({"_id": {"$in": oids}}, {"question_id": 1}):
+            qid = answer.get("question_id")
+            per_question[qid] = per_question.get(qid, 0) + 1
+        result = await db.answers.delete_many({"_id": {"$in": oids}})
+        deleted += result.deleted_count
+        removed = {ObjectId(qid): n for qid, n in per_question.items() if ObjectId.is_valid(qid)}
+        if removed:
+            await db.questions.bulk_write([
+                UpdateOne({"_id": oid}, {"$inc": {"answer_count": -n, "version": 1}})
+                for oid, n in removed.items()
+            ], ordered=False)
+            parents = await db.questions.find(
+                {"_id": {"$in": list(removed)}}, {"tags": 1, "answer_count": 1}
+            ).to_list()
+            await answers_removed(parents, removed)
+        await _delete_dependents("answer", aids)
+        await _delete_notifications({"answer_id": {"$in": aids}})
+        for qid in per_question:
+            if qid:
+                forget_thread_version(qid)
+    return deleted
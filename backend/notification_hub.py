@@ -0,0 +1,134 @@
+import asyncio
+import os
+from datetime import datetime
+from pymongo import UpdateOne
+from cache import TTLCache
+import database
+from database import db
+
+# Unread counters are cached per user and SSE subscribers are held per worker.
+# On a replica set every worker tails a change stream, so notifications
+# written by any worker reach all of them. Other count changes (mark-read,
+# moderation deletes) are announced with one upsert per user into
+# `notification_changes`, so a bulk mark-read is one event per worker, not
+# one per notification.
+# A standalone server has no change streams; then only one worker may run
+# (WEB_CONCURRENCY > 1 is refused at startup) and the writers update this
+# worker directly.
+UNREAD_COUNT_CACHE_SIZE = int(os.getenv("UNREAD_COUNT_CACHE_SIZE", "100000"))
+UNREAD_COUNT_CACHE_TTL = float(os.getenv("UNREAD_COUNT_CACHE_TTL", "300"))
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_unread_counts = TTLCache(UNREAD_COUNT_CACHE_SIZE, UNREAD_COUNT_CACHE_TTL)
+_subscribers = {}
+_watcher = None
+
+def subscribe(user_id: str):
+    queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+    _subscribers.setdefault(user_id, set()).add(queue)
+    return queue
+
+def unsubscribe(user_id: str, queue):
+    queues = _subscribers.get(user_id)
+    if queues:
+        queues.discard(queue)
+        if not queues:
+            del _subscribers[user_id]
+
+def publish(user_id: str, event: str, data):
+    for queue in _subscribers.get(user_id, ()):
+        try:
+            queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            pass  # a stalled client resyncs from the next unread_count event
+
+async def unread_count(user_id: str):
+    count = _unread_counts.get(user_id)
+    if count is None:
+        count = await db.notifications.count_documents({"user_id": user_id, "read": False})
+        _unread_counts.set(user_id, count)
+    return count
+
+async def _added(user_id: str, notifications):
+    count = _unread_counts.get(user_id)
+    if count is not None:
+        _unread_counts.set(user_id, count + len(notifications))
+    if user_id in _subscribers:
+        for notification in notifications:
+            publish(user_id, "notification", notification)
+        publish(user_id, "unread_count", {"unread_count": await unread_count(user_id)})
+
+async def notifications_added(user_id: str, notifications):
+    if _watcher is None:
+        await _added(user_id, notifications)
+    # else the change stream delivers them, to this worker like every other
+
+async def _announce(user_ids):
+    if _watcher is not None and user_ids:
+        now = datetime.utcnow()
+        await db.notification_changes.bulk_write([
+            UpdateOne({"_id": user_id}, {"$set": {"changed_at": now}}, upsert=True)
+            for user_id in user_ids
+        ], ordered=False)
+
+async def marked_read(user_id: str):
+    _unread_counts.set(user_id, 0)
+    publish(user_id, "unread_count", {"unread_count": 0})
+    await _announce([user_id])
+
+async def _recount(user_id: str):
+    _unread_counts.pop(user_id)
+    if user_id in _subscribers:
+        publish(user_id, "unread_count", {"unread_count": await unread_count(user_id)})
+
+async def notifications_removed(user_ids):
+    # Unread notifications of these users were deleted
+    if _watcher is None:
+        for user_id in user_ids:
+            await _recount(user_id)
+    await _announce(user_ids)
+
+async def _apply_change(change):
+    if change["ns"]["coll"] == "notifications":
+        doc = change["fullDocument"]
+        doc["_id"] = str(doc["_id"])
+        await _added(doc["user_id"], [doc])
+    else:
+        # Counts changed, possibly on another worker
+        await _recount(change["documentKey"]["_id"])
+
+async def _watch():
+    pipeline = [{"$match": {"$or": [
+        {"ns.coll": "notifications", "operationType": "insert"},
+        {"ns.coll": "notification_changes", "operationType": {"$in": ["insert", "update", "replace"]}},
+    ]}}]
+    resume_after = None
+    while True:
+        try:
+            async with await db.watch(pipeline, resume_after=resume_after) as stream:
+                async for change in stream:
+                    resume_after = stream.resume_token
+                    await _apply_change(change)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Counts may have missed events while the stream was down
+            print(f"Warning: notification change stream failed, reopening: {e}")
+            _unread_counts.clear()
+            await asyncio.sleep(1)
+
+async def start():
+    global _watcher
+    if database.supports_transactions:  # change streams need a replica set too
+        _watcher = asyncio.create_task(_watch())
+    elif int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        raise RuntimeError(
+            "Notifications need a replica set to reach every worker; run one worker on a standalone MongoDB"
+        )
+
+async def stop():
+    global _watcher
+    if _watcher is not None:
+        _watcher.cancel()
+        await asyncio.gather(_watcher, return_exceptions=True)
+        _watcher = None
@@ -0,0 +1,63 @@
+import re
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+from database import db
+import notification_hub
+
+MENTION_PATTERN = re.compile(r"@(\w+)")
+DUPLICATE_KEY = 11000
+
+async def insert_notifications(notifications):
+    # Notifications carry (user_id, answer_id, type), which is unique, so a
+    # retried job skips the ones an earlier attempt already wrote
+    if not notifications:
+        return
+    failed = set()
+    try:
+        await db.notifications.insert_many(notifications, ordered=False)
+    except BulkWriteError as e:
+        if any(err["code"] != DUPLICATE_KEY for err in e.details["writeErrors"]):
+            raise
+        failed = {err["index"] for err in e.details["writeErrors"]}
+
+    # Push what was actually written to connected clients
+    by_user = {}
+    for i, notification in enumerate(notifications):
+        if i not in failed:
+            notification["_id"] = str(notification["_id"])
+            by_user.setdefault(notification["user_id"], []).append(notification)
+    for user_id, user_notifications in by_user.items():
+        await notification_hub.notifications_added(user_id, user_notifications)
+
+async def notify_answer_posted(qid, question_owner_id, question_title, answer_id, author_id, author_name, content):
+    now = datetime.utcnow()
+    link = f"/questions/{qid}"
+    notifications = []
+
+    if question_owner_id != author_id:
+        notifications.append({
+            "user_id": question_owner_id,
+            "message": f"{author_name} answered your question: {question_title}",
+            "link": link,
+            "read": False,
+            "created_at": now,
+            "type": "answer",
+            "answer_id": answer_id,
+        })
+
+    # Detect mentions in content (e.g., "@alice") and resolve them in one query
+    usernames = set(MENTION_PATTERN.findall(content))
+    if usernames:
+        async for mentioned in db.users.find({"username": {"$in": list(usernames)}}, {"_id": 1}):
+            if str(mentioned["_id"]) != author_id:
+                notifications.append({
+                    "user_id": str(mentioned["_id"]),
+                    "message": f"{author_name} mentioned you in an answer",
+                    "link": link,
+                    "read": False,
+                    "created_at": now,
+                    "type": "mention",
+                    "answer_id": answer_id,
+                })
+
+    await insert_notifications(notifications)
@@ -0,0 +1,40 @@
+import base64
+from datetime import datetime
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value, last_id):
+    raw = json_util.dumps([sort_value, last_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+# Cursor values go straight into the query, so anything that could carry an
+# operator ({"$ne": ...}) or match arrays is refused
+_CURSOR_TYPES = (str, int, float, bool, datetime, ObjectId, type(None))
+
+def decode_cursor(cursor: str):
+    try:
+        sort_value, last_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(sort_value, _CURSOR_TYPES) or not isinstance(last_id, (ObjectId, str)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, last_id
+
+def keyset_filter(sort_key: str, cursor: str):
+    # Everything strictly after (sort_value, _id) in a (sort_key desc, _id desc) ordering
+    sort_value, last_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {sort_key: {"$lt": sort_value}},
+            {sort_key: sort_value, "_id": {"$lt": last_id}},
+        ]
+    }
+
+def next_cursor(page, sort_key: str, limit: int):
+    # page holds up to limit + 1 rows; the extra row only signals that more exist
+    if len(page) <= limit:
+        return None
+    last = page[limit - 1]
+    return encode_cursor(last.get(sort_key), last["_id"])
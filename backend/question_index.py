@@ -0,0 +1,105 @@
+import asyncio
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from database import db, run_command
+import jobs
+from embedding_index import EmbeddingIndex
+from file_lock import file_lock
+from config import QUESTION_INDEX_PATH
+from inference_backends import encoder_stamp
+
+# "exact" scans every vector; "ivf" probes AI_IVF_PROBES of the nearest
+# clusters once the index holds at least AI_IVF_MIN_ROWS questions
+AI_SIMILAR_MODE = os.getenv("AI_SIMILAR_MODE", "exact")
+AI_IVF_PROBES = int(os.getenv("AI_IVF_PROBES", "8"))
+AI_IVF_MIN_ROWS = int(os.getenv("AI_IVF_MIN_ROWS", "50000"))
+# Questions are embedded by a background job, in _id order, this many per
+# chunk. Only workers serving /ai/similar-questions schedule it, at most every
+# AI_INDEX_CATCHUP_INTERVAL seconds, and one worker at a time runs it.
+AI_INDEX_CATCHUP_BATCH = int(os.getenv("AI_INDEX_CATCHUP_BATCH", "256"))
+AI_INDEX_CATCHUP_INTERVAL = float(os.getenv("AI_INDEX_CATCHUP_INTERVAL", "5"))
+# ObjectIds from different processes are only ordered to the second, so the
+# newest few seconds of questions wait for the next run
+AI_INDEX_SETTLE_SECONDS = float(os.getenv("AI_INDEX_SETTLE_SECONDS", "5"))
+
+# Rows are appended in _id order only, so the last saved key is how far the
+# index has got; "order" in the stamp retires indexes built out of order
+question_index = EmbeddingIndex(
+    QUESTION_INDEX_PATH, dedupe=False, stamp={**encoder_stamp(), "order": "_id"}
+)
+_catchup_lock_path = QUESTION_INDEX_PATH + ".catchup.lock"
+_catchup = {"queued": False, "at": 0.0}
+
+def question_text(title: str, description: str):
+    # Descriptions are editor HTML; embed the visible text only
+    return f"{title} {re.sub(r'<[^>]+>', ' ', description or '')}".strip()
+
+def search_mode_probes():
+    if AI_SIMILAR_MODE == "ivf" and len(question_index) >= AI_IVF_MIN_ROWS:
+        return AI_IVF_PROBES
+    return None
+
+def build_ivf():
+    # About 4*sqrt(n) lists keeps each probed list a few hundred rows long
+    question_index.build_ivf(max(int(4 * len(question_index) ** 0.5), 1))
+
+async def _embed_until(until):
+    # Embeds questions after the last saved key up to until, saving each
+    # chunk, so an interrupted run resumes where it stopped
+    from routes.ai import embed_texts
+    await asyncio.to_thread(question_index.refresh)
+    while True:
+        query = {"_id": {"$lte": until}}
+        last_id = question_index.last_key()
+        if last_id:
+            query["_id"]["$gt"] = ObjectId(last_id)
+        chunk = await db.questions.find(query, {"title": 1, "description": 1}).sort("_id", 1).limit(
+            AI_INDEX_CATCHUP_BATCH
+        ).to_list()
+        if not chunk:
+            return
+        texts = [question_text(q.get("title", ""), q.get("description", "")) for q in chunk]
+        vectors = await asyncio.to_thread(embed_texts, texts)
+        await asyncio.to_thread(question_index.add, [str(q["_id"]) for q in chunk], vectors)
+        await asyncio.to_thread(question_index.save)
+
+async def catch_up_question_index():
+    try:
+        with file_lock(_catchup_lock_path, blocking=False) as acquired:
+            if not acquired:
+                return  # another worker is on it
+            settled = datetime.now(timezone.utc) - timedelta(seconds=AI_INDEX_SETTLE_SECONDS)
+            await _embed_until(ObjectId.from_datetime(settled))
+    finally:
+        _catchup["queued"] = False
+    if AI_SIMILAR_MODE == "ivf" and len(question_index) >= AI_IVF_MIN_ROWS:
+        await asyncio.to_thread(build_ivf)
+
+def schedule_catch_up():
+    now = time.monotonic()
+    if _catchup["queued"] or now - _catchup["at"] < AI_INDEX_CATCHUP_INTERVAL:
+        return
+    _catchup["queued"] = True
+    _catchup["at"] = now
+    jobs.enqueue(catch_up_question_index)
+
+async def load_question_index():
+    question_index.load()
+    if AI_SIMILAR_MODE == "ivf" and len(question_index) >= AI_IVF_MIN_ROWS:
+        await asyncio.to_thread(build_ivf)
+
+async def rebuild():
+    # Full offline rebuild; embeds the whole questions collection
+    for path in (question_index.keys_path, question_index.vectors_path, question_index.meta_path):
+        if os.path.exists(path):
+            os.remove(path)
+    question_index.load()
+    with file_lock(_catchup_lock_path):
+        await _embed_until(ObjectId.from_datetime(datetime.now(timezone.utc)))
+    print(f"Indexed {len(question_index)} questions")
+
+if __name__ == "__main__":
+    run_command("question_index.py", "build", rebuild)
@@ -0,0 +1,58 @@
+import orjson
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+
+# Routes with a response_model are serialized straight to bytes by pydantic,
+# as are the thread responses thread_cache renders itself. This covers
+# streamed lists and exports.
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+def _default(value):
+    # The only non-JSON type our documents carry besides datetimes, which
+    # orjson handles natively
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content):
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+def _encoder(model):
+    if model is None:
+        return dumps
+    # Validate each document against the response model as FastAPI would
+    return lambda doc: model.model_validate(doc).model_dump_json(by_alias=True).encode("utf-8")
+
+async def _encode(cursor, fmt: str, batch_size: int, model=None):
+    # Documents are encoded one at a time and written out a batch per chunk,
+    # so memory stays flat however large the result is
+    encode = _encoder(model)
+    chunk = [b"["] if fmt == "json" else []
+    first = True
+    count = 0
+    async for doc in cursor:
+        if fmt == "json":
+            if not first:
+                chunk.append(b",")
+            chunk.append(encode(doc))
+        else:
+            chunk.append(encode(doc) + b"\n")
+        first = False
+        count += 1
+        if count % batch_size == 0:
+            yield b"".join(chunk)
+            chunk = []
+    if fmt == "json":
+        chunk.append(b"]")
+    if chunk:
+        yield b"".join(chunk)
+
+def stream_documents(cursor, fmt: str = "ndjson", batch_size: int = 500, filename: str = None, model=None):
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'} if filename else None
+    return StreamingResponse(
+        _encode(cursor, fmt, batch_size, model), media_type=EXPORT_FORMATS[fmt], headers=headers
+    )
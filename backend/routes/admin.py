@@ -1,18 +1,101 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
+from pydantic import BaseModel
 from database import db
 from bson import ObjectId
-from deps import get_current_admin
+from deps import get_current_admin, invalidate_principal
+from moderation import delete_answers, delete_questions
+from pagination import NEXT_CURSOR_HEADER, keyset_filter, next_cursor
 
 router = APIRouter()
 
+# sort mode -> moderation_queue sort key
+QUEUE_SORTS = {
+    "severity": "count",
+    "recent": "latest_flag_at",
+}
+PREVIEW_LENGTH = 200
+
+class RoleRequest(BaseModel):
+    is_admin: bool
+
+class BulkDeleteRequest(BaseModel):
+    question_ids: List[str] = []
+    answer_ids: List[str] = []
+
 @router.delete("/questions/{qid}")
-def delete_question(qid: str, admin=Depends(get_current_admin)):
-    db.questions.delete_one({"_id": ObjectId(qid)})
-    db.answers.delete_many({"question_id": qid})
+async def delete_question(qid: str, admin=Depends(get_current_admin)):
+    await delete_questions([qid])
     return {"message": "Question and its answers deleted"}
 
 @router.delete("/answers/{aid}")
-def delete_answer(aid: str, admin=Depends(get_current_admin)):
-    db.answers.delete_one({"_id": ObjectId(aid)})
+async def delete_answer(aid: str, admin=Depends(get_current_admin)):
+    await delete_answers([aid])
     return {"message": "Answer deleted"}
 
+@router.put("/admin/users/{user_id}/role")
+async def set_user_role(user_id: str, request: RoleRequest, admin=Depends(get_current_admin)):
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    if user_id == str(admin["_id"]) and not request.is_admin:
+        raise HTTPException(status_code=400, detail="You cannot remove your own admin access")
+    result = await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"is_admin": request.is_admin}})
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Cached principals would otherwise keep the old role until their TTL ran out
+    invalidate_principal(user_id)
+    return {"message": "User promoted to admin" if request.is_admin else "Admin access removed"}
+
+async def _previews(entries):
+    # One $in lookup per item type for the text shown next to each queue entry
+    ids = {"question": [], "answer": []}
+    for e in entries:
+        if e.get("type") in ids and ObjectId.is_valid(e.get("item_id")):
+            ids[e["type"]].append(ObjectId(e["item_id"]))
+    previews = {}
+    async for q in db.questions.find({"_id": {"$in": ids["question"]}}, {"title": 1}):
+        previews[("question", str(q["_id"]))] = q.get("title", "")
+    async for a in db.answers.find(
+        {"_id": {"$in": ids["answer"]}},
+        {"content": {"$substrCP": ["$content", 0, PREVIEW_LENGTH]}},
+    ):
+        previews[("answer", str(a["_id"]))] = a.get("content", "")
+    return previews
+
+@router.get("/admin/moderation-queue")
+async def get_moderation_queue(
+    response: Response,
+    sort: str = Query("severity"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    admin=Depends(get_current_admin),
+):
+    if sort not in QUEUE_SORTS:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of {', '.join(QUEUE_SORTS)}")
+
+    sort_key = QUEUE_SORTS[sort]
+    query = keyset_filter(sort_key, cursor) if cursor else {}
+    entries = await db.moderation_queue.find(query).sort(
+        [(sort_key, -1), ("_id", -1)]
+    ).limit(limit + 1).to_list()
+
+    cursor_out = next_cursor(entries, sort_key, limit)
+    if cursor_out:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_out
+    entries = entries[:limit]
+
+    previews = await _previews(entries)
+    for e in entries:
+        # None means the item is already gone
+        e["preview"] = previews.get((e.get("type"), e.get("item_id")))
+    return entries
+
+@router.post("/admin/moderation/bulk-delete")
+async def bulk_delete(request: BulkDeleteRequest, admin=Depends(get_current_admin)):
+    deleted_questions, cascaded_answers = await delete_questions(request.question_ids)
+    deleted_answers = await delete_answers(request.answer_ids)
+    return {
+        "message": "Items and their dependents deleted",
+        "questions_deleted": deleted_questions,
+        "answers_deleted": deleted_answers + cascaded_answers,
+    }
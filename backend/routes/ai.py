@@ -1,23 +1,42 @@
-from fastapi import APIRouter, HTTPException
+import os
+from functools import lru_cache, partial
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List
-from transformers import AutoTokenizer, AutoModel, pipeline, AutoModelForSeq2SeqLM
-import torch
-import requests
+from bson import ObjectId
+from completion import completion_model
+from embedding_index import normalize
+from database import db
+from deps import get_current_admin
+from inference_backends import MODELS, load_model
+from inference_batcher import MicroBatcher
+from model_registry import ModelRegistry
+from question_index import question_index, question_text, schedule_catch_up, search_mode_probes
+from summary_cache import get_summary, store_summary, summary_key
+from tag_index import SEED_TAGS, schedule_tag_indexing, tag_index
 
 router = APIRouter()
 
-# Load MiniLM model and tokenizer (for tag suggestion and next word prediction)
-tokenizer = AutoTokenizer.from_pretrained('sentence-transformers/all-MiniLM-L6-v2')
-model = AutoModel.from_pretrained('sentence-transformers/all-MiniLM-L6-v2')
-# Load summarization pipeline (local model)
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-# Load T5-small summarization pipeline (local model)
-t5_summarizer = pipeline("summarization", model="t5-small")
+# Models load on first use (torch/transformers are only imported then), so
+# workers that never serve AI traffic stay small and start fast.
+AI_MODEL_MEMORY_BUDGET_MB = float(os.getenv("AI_MODEL_MEMORY_BUDGET_MB", "0")) or None
+AI_MODEL_IDLE_SECONDS = float(os.getenv("AI_MODEL_IDLE_SECONDS", "0")) or None
+AI_WARM_MODELS = [m for m in os.getenv("AI_WARM_MODELS", "").split(",") if m]
+# Concurrent requests are coalesced into padded batches of up to this size
+AI_BATCH_MAX_SIZE = int(os.getenv("AI_BATCH_MAX_SIZE", "16"))
+AI_BATCH_MAX_WAIT_MS = float(os.getenv("AI_BATCH_MAX_WAIT_MS", "10"))
+SUMMARY_PARAMS = {"max_length": 60, "min_length": 15, "do_sample": False}
+# Answers at least this long are summarized in the background when posted (0 = off)
+SUMMARY_PRECOMPUTE_MIN_CHARS = int(os.getenv("SUMMARY_PRECOMPUTE_MIN_CHARS", "0"))
 
-# Dummy tag list and embeddings (replace with your tag list and precomputed embeddings)
-TAGS = ["React", "JWT", "Authentication", "Python", "FastAPI", "MongoDB"]
-TAG_EMBEDDINGS = None  # To be initialized on first request
+registry = ModelRegistry(AI_MODEL_MEMORY_BUDGET_MB, AI_MODEL_IDLE_SECONDS)
+
+# minilm (tag suggestion, similar questions), bart and t5
+# (summarization), each on the backend chosen in inference_backends.py
+for _name in MODELS:
+    registry.register(_name, partial(load_model, _name))
 
 class TagSuggestRequest(BaseModel):
     title: str
@@ -33,57 +52,134 @@ class SummarizeRequest(BaseModel):
 class SummarizeResponse(BaseModel):
     summary: str
 
+class SimilarQuestionsRequest(BaseModel):
+    title: str
+    description: str = ""
+    limit: int = 5
+
+class SimilarQuestion(BaseModel):
+    id: str
+    title: str
+    score: float
+
+class SimilarQuestionsResponse(BaseModel):
+    questions: List[SimilarQuestion]
+
 class NextWordRequest(BaseModel):
     text: str
 
 class NextWordResponse(BaseModel):
     predictions: List[str]
 
-# Helper to compute embeddings
-def embed_text(text: str):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
+# Helpers to compute embeddings
+def embed_texts(texts: List[str]):
+    import torch
+    tokenizer, model = registry.get("minilm")
+    inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding=True)
     with torch.no_grad():
         embeddings = model(**inputs).last_hidden_state[:, 0, :]
-    return embeddings[0].numpy()
+    return list(embeddings.numpy())
+
+def _summarize_batch(model_name):
+    def run(texts: List[str]):
+        summarizer = registry.get(model_name)
+        return summarizer(texts, batch_size=len(texts), **SUMMARY_PARAMS)
+    return run
+
+batchers = {
+    "embed": MicroBatcher("embed", embed_texts, AI_BATCH_MAX_SIZE, AI_BATCH_MAX_WAIT_MS),
+    "bart": MicroBatcher("bart", _summarize_batch("bart"), AI_BATCH_MAX_SIZE, AI_BATCH_MAX_WAIT_MS),
+    "t5": MicroBatcher("t5", _summarize_batch("t5"), AI_BATCH_MAX_SIZE, AI_BATCH_MAX_WAIT_MS),
+}
+
+def embed_text(text: str):
+    return batchers["embed"].submit(text)
 
-def get_tag_embeddings():
-    global TAG_EMBEDDINGS
-    if TAG_EMBEDDINGS is None:
-        TAG_EMBEDDINGS = [embed_text(tag) for tag in TAGS]
-    return TAG_EMBEDDINGS
+@lru_cache(maxsize=1)
+def _seed_tag_vectors():
+    return normalize(embed_texts(SEED_TAGS))
+
+def _suggest_tags(text: str):
+    question_embedding = embed_text(text)
+    if len(tag_index):
+        return [tag for tag, _ in tag_index.search(question_embedding, 3)]
+    # The corpus tags are still being embedded
+    scores = _seed_tag_vectors() @ normalize(question_embedding)[0]
+    return [SEED_TAGS[i] for i in np.argsort(-scores)[:3]]
 
 @router.post("/ai/suggest-tags", response_model=TagSuggestResponse)
-def suggest_tags(req: TagSuggestRequest):
-    tag_embeddings = get_tag_embeddings()
-    question_embedding = embed_text(req.title + " " + req.description)
-    # Compute cosine similarity
-    from sklearn.metrics.pairwise import cosine_similarity
-    sims = cosine_similarity([question_embedding], tag_embeddings)[0]
-    top_indices = sims.argsort()[-3:][::-1]
-    suggested = [TAGS[i] for i in top_indices]
+async def suggest_tags(req: TagSuggestRequest):
+    schedule_tag_indexing()
+    suggested = await run_in_threadpool(_suggest_tags, req.title + " " + req.description)
     return TagSuggestResponse(suggested_tags=suggested)
 
+def _search_similar(text: str, k: int):
+    question_index.refresh()
+    return question_index.search(embed_text(text), k, n_probe=search_mode_probes())
+
+@router.post("/ai/similar-questions", response_model=SimilarQuestionsResponse)
+async def similar_questions(req: SimilarQuestionsRequest):
+    limit = max(1, min(req.limit, 20))
+    # Questions posted since the last run are embedded off the request path
+    schedule_catch_up()
+    # Over-fetch a little so questions deleted since they were indexed can be dropped
+    hits = await run_in_threadpool(
+        _search_similar, question_text(req.title, req.description), limit * 2
+    )
+    titles = {
+        str(q["_id"]): q["title"]
+        async for q in db.questions.find(
+            {"_id": {"$in": [ObjectId(qid) for qid, _ in hits]}}, {"title": 1}
+        )
+    }
+    return SimilarQuestionsResponse(questions=[
+        SimilarQuestion(id=qid, title=titles[qid], score=score)
+        for qid, score in hits if qid in titles
+    ][:limit])
+
+async def cached_summary(content: str, model_name: str):
+    # Summaries are keyed by a hash of (content, model, backend, generation params)
+    key = summary_key(content, model_name, SUMMARY_PARAMS)
+    summary = await get_summary(key)
+    if summary is None:
+        result = await run_in_threadpool(batchers[model_name].submit, content)
+        summary = result["summary_text"] if result else ""
+        await store_summary(key, model_name, summary)
+    return summary
+
+async def precompute_summary(content: str):
+    if not SUMMARY_PRECOMPUTE_MIN_CHARS or len(content) < SUMMARY_PRECOMPUTE_MIN_CHARS:
+        return
+    try:
+        await cached_summary(content, "bart")
+    except Exception as e:
+        print(f"Warning: background summarization failed: {e}")
+
 @router.post("/ai/summarize-answer", response_model=SummarizeResponse)
-def summarize_answer(req: SummarizeRequest):
+async def summarize_answer(req: SummarizeRequest):
     # Use local HuggingFace summarization model (BART or T5)
     try:
-        if req.model == "t5":
-            summary_list = t5_summarizer(req.content, max_length=60, min_length=15, do_sample=False)
-        else:
-            summary_list = summarizer(req.content, max_length=60, min_length=15, do_sample=False)
-        summary = summary_list[0]["summary_text"] if summary_list else ""
+        summary = await cached_summary(req.content, "t5" if req.model == "t5" else "bart")
         return SummarizeResponse(summary=summary)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Summarization failed: {str(e)}")
 
 @router.post("/ai/next-word", response_model=NextWordResponse)
-def next_word(req: NextWordRequest):
-    # Use MiniLM for next word prediction (not ideal, but for demo)
-    # In practice, use a language model like GPT-2 offline
-    input_ids = tokenizer.encode(req.text, return_tensors="pt")
-    with torch.no_grad():
-        outputs = model(input_ids)
-    # This is a placeholder: MiniLM is not a generative model
-    # For demo, return most likely next tokens from vocab
-    next_tokens = tokenizer.convert_ids_to_tokens(torch.topk(outputs.last_hidden_state[0, -1], 5).indices)
-    return NextWordResponse(predictions=next_tokens)
+async def next_word(req: NextWordRequest):
+    # Served from the corpus n-gram model in completion.py; no model inference
+    return NextWordResponse(predictions=completion_model.suggest(req.text, 5))
+
+@router.get("/ai/models")
+def model_stats(admin=Depends(get_current_admin)):
+    return registry.stats()
+
+@router.post("/ai/models/{name}/warm")
+def warm_model(name: str, admin=Depends(get_current_admin)):
+    if name not in registry:
+        raise HTTPException(status_code=404, detail="Unknown model")
+    registry.warm([name])
+    return {"message": f"Model {name} loaded"}
+
+@router.get("/ai/batch-stats")
+def batch_stats(admin=Depends(get_current_admin)):
+    return [b.stats() for b in batchers.values()]
@@ -1,38 +1,34 @@
-import re
 import traceback
-from fastapi import APIRouter, HTTPException, Depends
-from models import Answer, Vote
+from fastapi import APIRouter, HTTPException, Depends, Request
+from typing import List
+from models import Answer, AnswerOut, Vote
 from database import db
 from bson import ObjectId
 from datetime import datetime
+from authors import fetch_authors, set_author
+from completion import observe_text
 from deps import get_current_user
+import jobs
+from notifier import notify_answer_posted
+from routes.ai import precompute_summary
+from pymongo import ReturnDocument
+from pydantic import TypeAdapter
+from tag_stats import answer_added
+from thread_cache import bump_thread_version, conditional_get, forget_thread_version
+from votes import AlreadyVoted, VoteTargetNotFound, apply_vote
 
 router = APIRouter()
 
+ANSWERS_ADAPTER = TypeAdapter(List[AnswerOut])
 
-def serialize_answer(ans):
+
+def serialize_answer(ans, authors):
     ans["_id"] = str(ans["_id"])
-    # Fetch user information
-    if "user_id" in ans:
-        try:
-            # Try to convert user_id to ObjectId
-            user_object_id = ObjectId(ans["user_id"])
-            user = db.users.find_one({"_id": user_object_id})
-            if user:
-                ans["author"] = user["username"]
-                ans["author_avatar"] = user["username"][:2].upper()
-            else:
-                ans["author"] = "Unknown User"
-                ans["author_avatar"] = "U"
-        except Exception:
-            # Handle invalid ObjectId (legacy data)
-            print(f"Warning: Invalid user_id '{ans['user_id']}' for answer {ans['_id']}")
-            ans["author"] = "Legacy User"
-            ans["author_avatar"] = "LU"
-    else:
-        ans["author"] = "Anonymous"
-        ans["author_avatar"] = "A"
-    return ans
+    return set_author(ans, authors, "answer")
+
+async def serialize_answers(answers):
+    authors = await fetch_authors(answers)
+    return [serialize_answer(a, authors) for a in answers]
 
 
 from pydantic import BaseModel
@@ -41,41 +37,26 @@ class Vote(BaseModel):
     direction: str
 
 @router.post("/answers/{aid}/vote")
-def vote_answer(aid: str, vote: Vote, user=Depends(get_current_user)):
+async def vote_answer(aid: str, vote: Vote, user=Depends(get_current_user)):
     direction = vote.direction  # ✅ Extract direction from the body
 
     if direction not in ["up", "down"]:
         raise HTTPException(status_code=400, detail="Direction must be 'up' or 'down'")
 
     try:
-        answer = db.answers.find_one({"_id": ObjectId(aid)})
-        if not answer:
-            raise HTTPException(status_code=404, detail="Answer not found")
-
-        user_id = user["user_id"]
-        voters = answer.get("voters", {})
-
-        previous_vote = voters.get(user_id)
-
-        if previous_vote == direction:
+        try:
+            answer = await apply_vote("answer", aid, user["user_id"], direction, projection={"question_id": 1})
+        except AlreadyVoted:
             raise HTTPException(
                 status_code=400, detail=f"You already {direction}voted this answer"
             )
-
-        vote_change = 0
-        if previous_vote == "up" and direction == "down":
-            vote_change = -2
-        elif previous_vote == "down" and direction == "up":
-            vote_change = 2
-        elif previous_vote is None:
-            vote_change = 1 if direction == "up" else -1
-
-        db.answers.update_one(
-            {"_id": ObjectId(aid)},
-            {"$inc": {"votes": vote_change}, "$set": {f"voters.{user_id}": direction}},
-        )
+        except VoteTargetNotFound:
+            raise HTTPException(status_code=404, detail="Answer not found")
+        await bump_thread_version(answer["question_id"])
 
         return {"message": f"Vote updated to {direction}"}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error voting on answer {aid}: {e}")
         traceback.print_exc() 
@@ -83,13 +64,13 @@ def vote_answer(aid: str, vote: Vote, user=Depends(get_current_user)):
 
 
 @router.post("/answers/{aid}/accept")
-def accept_answer(aid: str, user=Depends(get_current_user)):
+async def accept_answer(aid: str, user=Depends(get_current_user)):
     try:
-        answer = db.answers.find_one({"_id": ObjectId(aid)})
+        answer = await db.answers.find_one({"_id": ObjectId(aid)})
         if not answer:
             raise HTTPException(status_code=404, detail="Answer not found")
 
-        question = db.questions.find_one({"_id": ObjectId(answer["question_id"])})
+        question = await db.questions.find_one({"_id": ObjectId(answer["question_id"])})
         if not question:
             raise HTTPException(status_code=404, detail="Question not found")
 
@@ -99,12 +80,13 @@ def accept_answer(aid: str, user=Depends(get_current_user)):
             )
 
         # Set accepted answer on question
-        db.questions.update_one(
+        await db.questions.update_one(
             {"_id": ObjectId(answer["question_id"])},
             {"$set": {"accepted_answer_id": str(aid)}},
         )
         # Mark answer as accepted
-        db.answers.update_one({"_id": ObjectId(aid)}, {"$set": {"is_accepted": True}})
+        await db.answers.update_one({"_id": ObjectId(aid)}, {"$set": {"is_accepted": True}})
+        await bump_thread_version(answer["question_id"])
 
         return {"message": "Answer marked as accepted"}
     except Exception as e:
@@ -113,11 +95,9 @@ def accept_answer(aid: str, user=Depends(get_current_user)):
 
 
 @router.post("/questions/{qid}/answers")
-def post_answer(qid: str, answer: Answer, user=Depends(get_current_user)):
+async def post_answer(qid: str, answer: Answer, user=Depends(get_current_user)):
     try:
-        if not db.questions.find_one({"_id": ObjectId(qid)}):
-            raise HTTPException(status_code=404, detail="Question not found")
-
+        question_oid = ObjectId(qid)
         answer_data = {
             "question_id": qid,
             "content": answer.content,
@@ -126,47 +106,71 @@ def post_answer(qid: str, answer: Answer, user=Depends(get_current_user)):
             "updated_at": datetime.utcnow(),
             "is_accepted": False,
             "votes": 0,
-            "voters": [],
         }
 
-        db.answers.insert_one(answer_data)
-
-        question = db.questions.find_one({"_id": ObjectId(qid)})
-
-        if question and question["user_id"] != user["user_id"]:
-            notification = {
-                "user_id": question["user_id"],
-                "message": f"{user['username']} answered your question: {question['title']}",
-                "link": f"/questions/{qid}",
-                "read": False,
-                "created_at": datetime.utcnow(),
-            }
-            db.notifications.insert_one(notification)
-
-        # Detect mentions in content (e.g., "@alice")
-        mention_pattern = r"@(\w+)"
-        mentioned_usernames = re.findall(mention_pattern, answer_data["content"])
-
-        for uname in mentioned_usernames:
-            mentioned_user = db.users.find_one({"username": uname})
-            if mentioned_user and str(mentioned_user["_id"]) != user["user_id"]:
-                db.notifications.insert_one(
-                    {
-                        "user_id": str(mentioned_user["_id"]),
-                        "message": f"{user['username']} mentioned you in an answer",
-                        "link": f"/questions/{qid}",
-                        "read": False,
-                        "created_at": datetime.utcnow(),
-                    }
-                )
+        result = await db.answers.insert_one(answer_data)
+        # One write counts the answer, bumps the thread version (last, after
+        # the answer exists) and returns what the notifications need
+        question = await db.questions.find_one_and_update(
+            {"_id": question_oid},
+            {"$inc": {"answer_count": 1, "version": 1}},
+            projection={"user_id": 1, "title": 1, "tags": 1, "answer_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not question:
+            await db.answers.delete_one({"_id": result.inserted_id})
+            raise HTTPException(status_code=404, detail="Question not found")
+        forget_thread_version(qid)
+        observe_text("answer", str(result.inserted_id), answer.content)
+
+        # Tag stats, answer/@mention notifications and the summary are
+        # produced off the request path
+        jobs.enqueue(
+            answer_added,
+            str(result.inserted_id),
+            question.get("tags"),
+            question["answer_count"] == 1,
+            answer_data["created_at"],
+        )
+        jobs.enqueue(
+            notify_answer_posted,
+            qid,
+            question.get("user_id"),
+            question.get("title", ""),
+            str(result.inserted_id),
+            user["user_id"],
+            user["username"],
+            answer.content,
+        )
+        jobs.enqueue(precompute_summary, answer.content)
 
         return {"message": "Answer posted"}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error posting answer to question {qid}: {e}")
         raise HTTPException(status_code=400, detail="Invalid question ID or posting error")
 
 
-@router.get("/questions/{qid}/answers")
-def get_answers(qid: str):
-    answers = list(db.answers.find({"question_id": qid}))
-    return [serialize_answer(a) for a in answers]
+@router.get("/questions/{qid}/answers", response_model=List[AnswerOut])
+async def get_answers(qid: str, request: Request):
+    async def build(source):
+        # The question's version and its answers in one read, so both come
+        # from the same member
+        if not ObjectId.is_valid(qid):
+            return None, []
+        thread = await (await source.questions.aggregate([
+            {"$match": {"_id": ObjectId(qid)}},
+            {"$project": {"version": 1}},
+            {"$lookup": {
+                "from": "answers",
+                "let": {"qid": {"$toString": "$_id"}},
+                "pipeline": [{"$match": {"$expr": {"$eq": ["$question_id", "$$qid"]}}}],
+                "as": "answers",
+            }},
+        ])).to_list()
+        if not thread:
+            return None, []
+        return thread[0].get("version", 0), await serialize_answers(thread[0]["answers"])
+
+    return await conditional_get(request, "answers", qid, build, ANSWERS_ADAPTER)
@@ -1,32 +1,69 @@
 from datetime import datetime
 from fastapi import APIRouter, HTTPException
 from models import UserRegister, UserLogin
-from auth import hash_password, verify_password, create_access_token
+from auth import (
+    PasswordHasherBusy,
+    create_access_token,
+    hash_password_async,
+    password_needs_rehash,
+    verify_password_async,
+)
 from database import db
+from deps import invalidate_principal
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
 
+def _hasher_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-in requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register")
-def register(user: UserRegister):
-    if db.users.find_one({"email": user.email}):
+async def register(user: UserRegister):
+    if await db.users.find_one({"email": user.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_pw = hash_password(user.password)
-    db.users.insert_one({
-        "username": user.username,
-        "email": user.email,
-        "password": hashed_pw,
-        "created_at": datetime.utcnow(),
-        "is_admin": user.is_admin
-    })
+    try:
+        hashed_pw = await hash_password_async(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    try:
+        await db.users.insert_one({
+            "username": user.username,
+            "email": user.email,
+            "password": hashed_pw,
+            "created_at": datetime.utcnow(),
+            "is_admin": user.is_admin
+        })
+    except DuplicateKeyError:
+        # A concurrent registration won the unique email index
+        raise HTTPException(status_code=400, detail="Email already registered")
     return {"message": "User registered successfully"}
 
 @router.post("/login")
-def login(user: UserLogin):
-    db_user = db.users.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["password"]):
-        raise HTTPException(status_code=401, detail="Invalid email or password")
+async def login(user: UserLogin):
+    db_user = await db.users.find_one({"email": user.email})
+    try:
+        if not db_user or not await verify_password_async(user.password, db_user["password"]):
+            raise HTTPException(status_code=401, detail="Invalid email or password")
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+    # Transparently upgrade hashes made with a different BCRYPT_ROUNDS. The
+    # password already checked out, so a busy pool only postpones the upgrade
+    # to a later login.
+    if password_needs_rehash(db_user["password"]):
+        try:
+            await db.users.update_one(
+                {"_id": db_user["_id"], "password": db_user["password"]},
+                {"$set": {"password": await hash_password_async(user.password)}},
+            )
+            invalidate_principal(db_user["_id"])
+        except PasswordHasherBusy:
+            pass
     
     token = create_access_token({"user_id": str(db_user["_id"]), "username": db_user["username"]})
     return {"access_token": token, "token_type": "bearer"}
-
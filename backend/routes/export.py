@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from bson import ObjectId
+from database import read_db
+from deps import get_current_admin
+from responses import EXPORT_FORMATS, stream_documents
+
+router = APIRouter()
+
+# collection -> projection; never export password hashes or the legacy voters map
+EXPORTS = {
+    "questions": {"voters": 0},
+    "answers": {"voters": 0},
+    "users": {"password": 0},
+    "notifications": None,
+    "flags": None,
+    "votes": None,
+}
+EXPORT_BATCH_SIZE = 1000
+
+# Bulk export for data tooling, streamed in _id order so a run can resume
+# with ?after=<last _id seen>
+@router.get("/admin/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = Query("ndjson"),
+    after: Optional[str] = Query(None),
+    admin=Depends(get_current_admin),
+):
+    if collection not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Collection must be one of {', '.join(EXPORTS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {', '.join(EXPORT_FORMATS)}")
+    if after and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid after id")
+
+    query = {"_id": {"$gt": ObjectId(after)}} if after else {}
+    cursor = read_db[collection].find(query, EXPORTS[collection]).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    return stream_documents(cursor, format, EXPORT_BATCH_SIZE, filename=f"{collection}.{format}")
@@ -1,34 +1,38 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
+from typing import List, Optional
 from database import db
 from bson import ObjectId
 from deps import get_current_admin, get_current_user
-from datetime import datetime
+from models import FlagOut
+from moderation import record_flag
+from pagination import NEXT_CURSOR_HEADER, keyset_filter, next_cursor
 
 router = APIRouter()
 
 @router.post("/questions/{qid}/flag")
-def flag_question(qid: str, user=Depends(get_current_user)):
-    db.flags.insert_one({
-        "type": "question",
-        "item_id": qid,
-        "flagged_by": user["user_id"],
-        "created_at": datetime.utcnow()
-    })
+async def flag_question(qid: str, user=Depends(get_current_user)):
+    await record_flag("question", qid, user["user_id"])
     return {"message": "Question flagged"}
 
 @router.post("/answers/{aid}/flag")
-def flag_answer(aid: str, user=Depends(get_current_user)):
-    db.flags.insert_one({
-        "type": "answer",
-        "item_id": aid,
-        "flagged_by": user["user_id"],
-        "created_at": datetime.utcnow()
-    })
+async def flag_answer(aid: str, user=Depends(get_current_user)):
+    await record_flag("answer", aid, user["user_id"])
     return {"message": "Answer flagged"}
 
-@router.get("/admin/flags")
-def get_flags(admin=Depends(get_current_admin)):
-    flags = list(db.flags.find().sort("created_at", -1))
+@router.get("/admin/flags", response_model=List[FlagOut])
+async def get_flags(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    admin=Depends(get_current_admin),
+):
+    # Raw flag rows, newest first; see /admin/moderation-queue for the grouped view
+    query = keyset_filter("created_at", cursor) if cursor else {}
+    flags = await db.flags.find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list()
+    cursor_out = next_cursor(flags, "created_at", limit)
+    if cursor_out:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_out
+    flags = flags[:limit]
     for f in flags:
         f["_id"] = str(f["_id"])
     return flags
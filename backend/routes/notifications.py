@@ -1,39 +1,80 @@
 from fastapi import APIRouter, Depends, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
 from datetime import datetime
+import asyncio
+import json
 import re
 
-from database import db
-from deps import get_current_user
+from typing import List
+from database import db, read_db
+from models import NotificationOut
+from deps import get_current_user, get_principal
+import notification_hub
+from responses import stream_documents
 
 router = APIRouter()
 
-# Get notifications (with optional filter)
-@router.get("/notifications")
-def get_notifications(user=Depends(get_current_user), unread_only: bool = Query(False)):
+SSE_KEEPALIVE_SECONDS = 20
+NOTIFICATION_BATCH_SIZE = 200
+
+# Get notifications (with optional filter). A user's history grows without
+# bound, so it is streamed as a JSON array a batch at a time instead of being
+# loaded whole; each entry is still validated against NotificationOut.
+@router.get(
+    "/notifications",
+    response_model=None,
+    responses={200: {"model": List[NotificationOut]}},
+)
+async def get_notifications(user=Depends(get_current_user), unread_only: bool = Query(False)):
     query = {"user_id": user["user_id"]}
     if unread_only:
         query["read"] = False
 
-    notifs = list(db.notifications.find(query).sort("created_at", -1))
-    for n in notifs:
-        n["_id"] = str(n["_id"])
-    return notifs
+    cursor = read_db.notifications.find(query).sort("created_at", -1).batch_size(NOTIFICATION_BATCH_SIZE)
+    return stream_documents(cursor, "json", NOTIFICATION_BATCH_SIZE, model=NotificationOut)
 
-# Get count of unread notifications
+# Get count of unread notifications (served from the per-user counter)
 @router.get("/notifications/count")
-def get_notification_count(user=Depends(get_current_user)):
-    count = db.notifications.count_documents({
-        "user_id": user["user_id"],
-        "read": False
-    })
+async def get_notification_count(user=Depends(get_current_user)):
+    count = await notification_hub.unread_count(user["user_id"])
     return {"unread_count": count}
 
+# Push new notifications and unread-count changes as server-sent events.
+# EventSource can't set headers, so the bearer token comes as a query param.
+@router.get("/notifications/stream")
+async def stream_notifications(token: str = Query(...)):
+    principal = await get_principal(token)
+    user_id = str(principal["_id"])
+
+    async def events():
+        queue = notification_hub.subscribe(user_id)
+        try:
+            count = await notification_hub.unread_count(user_id)
+            yield f"event: unread_count\ndata: {json.dumps({'unread_count': count})}\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+        finally:
+            notification_hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Mark all as read
 @router.post("/notifications/mark-read")
-def mark_read(user=Depends(get_current_user)):
-    db.notifications.update_many(
+async def mark_read(user=Depends(get_current_user)):
+    await db.notifications.update_many(
         {"user_id": user["user_id"], "read": False},
         {"$set": {"read": True}}
     )
+    await notification_hub.marked_read(user["user_id"])
     return {"message": "All notifications marked as read"}
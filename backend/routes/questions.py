@@ -1,51 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException
+import html
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import List, Optional
+from authors import fetch_authors, set_author
+from completion import observe_text
 from deps import get_current_user
-from models import Question
-from database import db
+from html_text import preview
+from models import Question, QuestionOut
+from database import db, read_db
 from bson import ObjectId
 from datetime import datetime
-from pydantic import BaseModel
+from pymongo import UpdateOne
+from pydantic import BaseModel, TypeAdapter
+from pagination import NEXT_CURSOR_HEADER, keyset_filter, next_cursor
+from tag_index import observe_tags
+from tag_stats import question_added
+from thread_cache import conditional_get, forget_thread_version
+from votes import AlreadyVoted, VoteTargetNotFound, apply_vote
 
 router = APIRouter()
 
+# sort mode -> (sort key, extra match)
+FEED_SORTS = {
+    "newest": ("created_at", {}),
+    "votes": ("votes", {}),
+    "unanswered": ("created_at", {"answer_count": 0}),
+}
+DESCRIPTION_PREVIEW_LENGTH = 300
+QUESTION_ADAPTER = TypeAdapter(QuestionOut)
+BACKFILL_BATCH_SIZE = 500
+
 class VoteRequest(BaseModel):
     direction: str
 
-def serialize_question(q):
+def serialize_question(q, authors):
     q["_id"] = str(q["_id"])
-    # Fetch user information
-    if "user_id" in q:
-        try:
-            # Try to convert user_id to ObjectId
-            user_object_id = ObjectId(q["user_id"])
-            user = db.users.find_one({"_id": user_object_id})
-            if user:
-                q["author"] = user["username"]
-                q["author_avatar"] = user["username"][:2].upper()
-            else:
-                q["author"] = "Unknown User"
-                q["author_avatar"] = "U"
-        except Exception:
-            # Handle invalid ObjectId (legacy data)
-            print(f"Warning: Invalid user_id '{q['user_id']}' for question {q['_id']}")
-            q["author"] = "Legacy User"
-            q["author_avatar"] = "LU"
-    else:
-        q["author"] = "Anonymous"
-        q["author_avatar"] = "A"
-    
-    # Count answers for this question
-    answer_count = db.answers.count_documents({"question_id": str(q["_id"])})
-    q["answer_count"] = answer_count
-    
+    q.pop("preview", None)
+    set_author(q, authors, "question")
+
+    # answer_count is maintained by post_answer / delete_answer
+    q["answer_count"] = q.get("answer_count", 0)
+
     # Ensure tags field exists
     if "tags" not in q:
         q["tags"] = []
-    
+
     return q
 
+async def serialize_questions(questions):
+    authors = await fetch_authors(questions)
+    return [serialize_question(q, authors) for q in questions]
+
+def description_preview(description: str):
+    # The feed shows the start of the text, not of the markup; escaped again
+    # because clients treat description as HTML
+    return html.escape(preview(description, DESCRIPTION_PREVIEW_LENGTH), quote=False)
+
+async def backfill_previews():
+    # One-off migration for questions created before the preview was stored
+    if await db.migrations.find_one({"_id": "question_previews"}):
+        return
+    updates = []
+    async for q in db.questions.find({"preview": {"$exists": False}}, {"description": 1}):
+        updates.append(UpdateOne(
+            {"_id": q["_id"]}, {"$set": {"preview": description_preview(q.get("description", ""))}}
+        ))
+        if len(updates) >= BACKFILL_BATCH_SIZE:
+            await db.questions.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.questions.bulk_write(updates, ordered=False)
+    # Upserted: workers starting together may both get here
+    await db.migrations.update_one(
+        {"_id": "question_previews"}, {"$setOnInsert": {"applied_at": datetime.utcnow()}}, upsert=True
+    )
+
+async def backfill_answer_counts():
+    # One-off migration for questions created before answer_count was stored
+    missing = [
+        q["_id"]
+        async for q in db.questions.find({"answer_count": {"$exists": False}}, {"_id": 1})
+    ]
+    if not missing:
+        return
+    counts = {
+        row["_id"]: row["count"]
+        async for row in await db.answers.aggregate([
+            {"$match": {"question_id": {"$in": [str(qid) for qid in missing]}}},
+            {"$group": {"_id": "$question_id", "count": {"$sum": 1}}},
+        ])
+    }
+    await db.questions.bulk_write([
+        UpdateOne(
+            {"_id": qid, "answer_count": {"$exists": False}},
+            {"$set": {"answer_count": counts.get(str(qid), 0)}},
+        )
+        for qid in missing
+    ])
+
 @router.post("/questions")
-def ask_question(question: Question, user = Depends(get_current_user)):
+async def ask_question(question: Question, user = Depends(get_current_user)):
     question_data = question.dict()
     question_data["user_id"] = user["user_id"]
     question_data["username"] = user["username"]
@@ -53,61 +106,85 @@ def ask_question(question: Question, user = Depends(get_current_user)):
     question_data["updated_at"] = datetime.utcnow()
     question_data["accepted_answer_id"] = None
     question_data["votes"] = 0
-    question_data["voters"] = {}
-    result = db.questions.insert_one(question_data)
+    question_data["answer_count"] = 0
+    question_data["version"] = 0
+    question_data["preview"] = description_preview(question_data["description"])
+    result = await db.questions.insert_one(question_data)
+    await question_added(question_data["tags"], question_data["created_at"])
+    observe_tags(question_data["tags"])
+    observe_text("question", str(result.inserted_id), f"{question_data['title']}\n{question_data['description']}")
     return {"message": "Question posted", "id": str(result.inserted_id)}
 
-@router.get("/questions")
-def get_all_questions():
-    questions = list(db.questions.find())
-    return [serialize_question(q) for q in questions]
+@router.get("/questions", response_model=List[QuestionOut])
+async def get_all_questions(
+    response: Response,
+    sort: str = Query("newest"),
+    tag: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+):
+    if sort not in FEED_SORTS:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of {', '.join(FEED_SORTS)}")
 
-@router.get("/questions/{id}")
-def get_question(id: str):
-    try:
-        question = db.questions.find_one({"_id": ObjectId(id)})
-        if not question:
-            raise HTTPException(status_code=404, detail="Question not found")
-        return serialize_question(question)
-    except Exception as e:
-        print(f"Error getting question {id}: {e}")
-        raise HTTPException(status_code=400, detail="Invalid question ID")
+    sort_key, match = FEED_SORTS[sort]
+    match = dict(match)
+    if tag:
+        match["tags"] = tag
+    if cursor:
+        match.update(keyset_filter(sort_key, cursor))
+
+    # Lean feed projection: no voters map and the stored plain-text preview in
+    # place of the description
+    questions = await (await read_db.questions.aggregate([
+        {"$match": match},
+        {"$sort": {sort_key: -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$set": {"description": {"$ifNull": ["$preview", ""]}}},
+        {"$unset": ["voters", "preview"]},
+    ])).to_list()
+
+    cursor_out = next_cursor(questions, sort_key, limit)
+    if cursor_out:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_out
+    return await serialize_questions(questions[:limit])
+
+@router.get("/questions/{id}", response_model=QuestionOut)
+async def get_question(id: str, request: Request):
+    async def build(source):
+        try:
+            question = await source.questions.find_one({"_id": ObjectId(id)})
+            if not question:
+                raise HTTPException(status_code=404, detail="Question not found")
+            return question.get("version", 0), (await serialize_questions([question]))[0]
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"Error getting question {id}: {e}")
+            raise HTTPException(status_code=400, detail="Invalid question ID")
+
+    return await conditional_get(request, "question", id, build, QUESTION_ADAPTER)
 
 @router.post("/questions/{qid}/vote")
-def vote_question(qid: str, vote_request: VoteRequest, user=Depends(get_current_user)):
+async def vote_question(qid: str, vote_request: VoteRequest, user=Depends(get_current_user)):
     direction = vote_request.direction
     if direction not in ["up", "down"]:
         raise HTTPException(status_code=400, detail="Direction must be 'up' or 'down'")
 
     try:
-        question = db.questions.find_one({"_id": ObjectId(qid)})
-        if not question:
-            raise HTTPException(status_code=404, detail="Question not found")
-
-        user_id = user["user_id"]
-        voters = question.get("voters", {})
-
-        previous_vote = voters.get(user_id)
-
-        if previous_vote == direction:
+        try:
+            # The version bump rides along with the score update
+            await apply_vote("question", qid, user["user_id"], direction, inc={"version": 1})
+        except AlreadyVoted:
             raise HTTPException(
                 status_code=400, detail=f"You already {direction}voted this question"
             )
-
-        vote_change = 0
-        if previous_vote == "up" and direction == "down":
-            vote_change = -2  # reversing upvote (+1 → -1)
-        elif previous_vote == "down" and direction == "up":
-            vote_change = 2  # reversing downvote (-1 → +1)
-        elif previous_vote is None:
-            vote_change = 1 if direction == "up" else -1
-
-        db.questions.update_one(
-            {"_id": ObjectId(qid)},
-            {"$inc": {"votes": vote_change}, "$set": {f"voters.{user_id}": direction}},
-        )
+        except VoteTargetNotFound:
+            raise HTTPException(status_code=404, detail="Question not found")
+        forget_thread_version(qid)
 
         return {"message": f"Vote updated to {direction}"}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error voting on question {qid}: {e}")
         raise HTTPException(status_code=400, detail="Invalid question ID or voting error")
@@ -0,0 +1,115 @@
+import html
+import re
+from fastapi import APIRouter, Query
+from bson import ObjectId
+from database import read_db
+from html_text import plain_text
+from routes.questions import serialize_questions
+
+router = APIRouter()
+
+# A matching answer counts for less than a match in the question itself
+ANSWER_SCORE_WEIGHT = 0.5
+SNIPPET_LENGTH = 200
+SEARCH_PROJECTION = {
+    "score": {"$meta": "textScore"},
+    "title": 1,
+    "description": 1,
+    "tags": 1,
+    "votes": 1,
+    "answer_count": 1,
+    "accepted_answer_id": 1,
+    "user_id": 1,
+    "username": 1,
+    "created_at": 1,
+}
+
+def _terms(query: str):
+    # Words the text index matched on; negated terms are never highlighted
+    return [t for t in re.findall(r"-?\w+", query) if not t.startswith("-")]
+
+def highlight(text: str, terms):
+    # Matches are found on the plain text and every piece is escaped on its
+    # own, so only <mark> reaches the client as markup
+    if not terms:
+        return html.escape(text, quote=False)
+    pattern = re.compile(r"\b(" + "|".join(re.escape(t) for t in terms) + r")", re.IGNORECASE)
+    pieces = []
+    end = 0
+    for match in pattern.finditer(text):
+        pieces.append(html.escape(text[end:match.start()], quote=False))
+        pieces.append("<mark>" + html.escape(match.group(), quote=False) + "</mark>")
+        end = match.end()
+    pieces.append(html.escape(text[end:], quote=False))
+    return "".join(pieces)
+
+def snippet(markup: str, terms):
+    text = plain_text(markup)
+    start = 0
+    for term in terms:
+        match = re.search(r"\b" + re.escape(term), text, re.IGNORECASE)
+        if match:
+            start = max(match.start() - SNIPPET_LENGTH // 4, 0)
+            break
+    excerpt = text[start:start + SNIPPET_LENGTH]
+    prefix = "…" if start else ""
+    suffix = "…" if start + SNIPPET_LENGTH < len(text) else ""
+    return prefix + highlight(excerpt, terms) + suffix
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    page: int = Query(1, ge=1, le=50),
+    limit: int = Query(20, ge=1, le=50),
+):
+    # Both text indexes are read in relevance order and only as deep as the
+    # requested page reaches
+    window = page * limit
+    questions = await read_db.questions.find(
+        {"$text": {"$search": q}}, SEARCH_PROJECTION
+    ).sort([("score", {"$meta": "textScore"})]).limit(window + 1).to_list()
+
+    answer_hits = await (await read_db.answers.aggregate([
+        {"$match": {"$text": {"$search": q}}},
+        {"$set": {"score": {"$meta": "textScore"}}},
+        {"$sort": {"score": -1}},
+        {"$limit": window + 1},
+        {"$group": {"_id": "$question_id", "score": {"$max": "$score"}, "content": {"$first": "$content"}}},
+    ])).to_list()
+
+    scores = {str(doc["_id"]): doc["score"] for doc in questions}
+    answer_content = {}
+    for hit in answer_hits:
+        scores[hit["_id"]] = scores.get(hit["_id"], 0) + ANSWER_SCORE_WEIGHT * hit["score"]
+        answer_content[hit["_id"]] = hit["content"]
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    page_ids = ranked[(page - 1) * limit:window]
+
+    docs = {str(doc["_id"]): doc for doc in questions}
+    question_matches = set(docs)
+    missing = [ObjectId(qid) for qid in page_ids if qid not in docs and ObjectId.is_valid(qid)]
+    if missing:
+        async for doc in read_db.questions.find({"_id": {"$in": missing}}, SEARCH_PROJECTION):
+            docs[str(doc["_id"])] = doc
+
+    terms = _terms(q)
+    results = []
+    for qid in page_ids:
+        doc = docs.get(qid)
+        if not doc:
+            continue
+        doc["score"] = scores[qid]
+        doc["title_highlight"] = highlight(doc.get("title", ""), terms)
+        # Quote the question body when it matched, otherwise its best answer
+        source = doc.get("description", "") if qid in question_matches else answer_content.get(qid, "")
+        doc["snippet"] = snippet(source, terms)
+        doc.pop("description", None)
+        results.append(doc)
+
+    return {
+        "query": q,
+        "page": page,
+        "results": await serialize_questions(results),
+        "has_more": len(ranked) > window,
+    }
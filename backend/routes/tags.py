@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import List, Optional
+from database import read_db
+from models import QuestionOut, TagStatsOut
+from pagination import NEXT_CURSOR_HEADER, keyset_filter, next_cursor
+from routes.questions import get_all_questions
+
+router = APIRouter()
+
+# sort mode -> tag_stats sort key
+TAG_SORTS = {
+    "popular": "question_count",
+    "recent": "last_activity_at",
+}
+# Feeds the tags/created_at index can serve a page at a time
+TAG_FEED_SORTS = ("newest", "unanswered")
+# recent_answers is tag_stats bookkeeping, not part of the response
+STATS_PROJECTION = {"recent_answers": 0}
+
+def serialize_tag(stats):
+    stats["tag"] = stats.pop("_id")
+    return stats
+
+@router.get("/tags", response_model=List[TagStatsOut])
+async def get_tags(
+    response: Response,
+    sort: str = Query("popular"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+):
+    if sort not in TAG_SORTS:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of {', '.join(TAG_SORTS)}")
+
+    sort_key = TAG_SORTS[sort]
+    query = keyset_filter(sort_key, cursor) if cursor else {}
+    tags = await read_db.tag_stats.find(query, STATS_PROJECTION).sort(
+        [(sort_key, -1), ("_id", -1)]
+    ).limit(limit + 1).to_list()
+
+    cursor_out = next_cursor(tags, sort_key, limit)
+    if cursor_out:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_out
+    return [serialize_tag(t) for t in tags[:limit]]
+
+# Tags are free text and may contain "/", so both routes take the rest of the
+# path; the feed is declared first so ".../questions" reaches it
+@router.get("/tags/{tag:path}/questions", response_model=List[QuestionOut])
+async def get_tag_questions(
+    tag: str,
+    response: Response,
+    sort: str = Query("newest"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+):
+    if sort not in TAG_FEED_SORTS:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of {', '.join(TAG_FEED_SORTS)}")
+    return await get_all_questions(response, sort=sort, tag=tag, cursor=cursor, limit=limit)
+
+@router.get("/tags/{tag:path}", response_model=TagStatsOut)
+async def get_tag(tag: str):
+    stats = await read_db.tag_stats.find_one({"_id": tag}, STATS_PROJECTION)
+    if not stats:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    return serialize_tag(stats)
@@ -0,0 +1,42 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from cache import TTLCache
+from database import db
+from inference_backends import effective_backend
+
+# In-process LRU in front of the persistent `summaries` collection
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))
+_recent = TTLCache(SUMMARY_CACHE_SIZE)
+
+def summary_key(content: str, model: str, params: dict):
+    # Quantized and ONNX backends word summaries differently from fp32, so a
+    # backend switch must not serve the other backend's cached text
+    raw = json.dumps(
+        {"content": content, "model": model, "backend": effective_backend(model), "params": params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+async def get_summary(key: str):
+    summary = _recent.get(key)
+    if summary is None:
+        doc = await db.summaries.find_one({"_id": key}, {"summary": 1})
+        if doc:
+            summary = doc["summary"]
+            _recent.set(key, summary)
+    return summary
+
+async def store_summary(key: str, model: str, summary: str):
+    _recent.set(key, summary)
+    await db.summaries.update_one(
+        {"_id": key},
+        {"$setOnInsert": {
+            "summary": summary,
+            "model": model,
+            "backend": effective_backend(model),
+            "created_at": datetime.utcnow(),
+        }},
+        upsert=True,
+    )
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from database import db
+import jobs
+from config import TAG_INDEX_PATH
+from embedding_index import EmbeddingIndex
+from inference_backends import encoder_stamp
+
+# Suggested until the corpus tags are embedded, or while the corpus has none
+SEED_TAGS = ["React", "JWT", "Authentication", "Python", "FastAPI", "MongoDB"]
+
+tag_index = EmbeddingIndex(TAG_INDEX_PATH, stamp=encoder_stamp())
+
+# Tags seen in the corpus but not embedded yet. Recording them is cheap and
+# needs no model; the next suggestion request schedules index_pending_tags,
+# so only workers serving AI traffic load the encoder.
+_pending_tags = set()
+_pending_lock = threading.Lock()
+_indexing = {"queued": False}
+
+def observe_tags(tags):
+    new_tags = [t for t in tags if t and t not in tag_index]
+    if new_tags:
+        with _pending_lock:
+            _pending_tags.update(new_tags)
+
+def take_pending_tags():
+    with _pending_lock:
+        tags = sorted(_pending_tags)
+        _pending_tags.clear()
+    return tags
+
+async def index_pending_tags():
+    # Embeds the pending tags in chunks off the request path
+    from routes.ai import embed_texts
+    try:
+        await asyncio.to_thread(tag_index.refresh)
+        tags = [t for t in take_pending_tags() if t not in tag_index]
+        try:
+            for start in range(0, len(tags), 256):
+                chunk = tags[start:start + 256]
+                vectors = await asyncio.to_thread(embed_texts, chunk)
+                await asyncio.to_thread(tag_index.add, chunk, vectors)
+            await asyncio.to_thread(tag_index.save)
+        except Exception:
+            observe_tags(tags)
+            raise
+    finally:
+        _indexing["queued"] = False
+
+def schedule_tag_indexing():
+    with _pending_lock:
+        if not _pending_tags or _indexing["queued"]:
+            return
+        _indexing["queued"] = True
+    jobs.enqueue(index_pending_tags)
+
+async def load_tag_index():
+    tag_index.load()
+    corpus_tags = await db.questions.distinct("tags")
+    observe_tags(corpus_tags or SEED_TAGS)
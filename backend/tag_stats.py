@@ -0,0 +1,89 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from database import db
+
+# One tag_stats document per tag, keyed by the tag itself:
+#   question_count, answered_count (questions with at least one answer),
+#   answer_count, last_activity_at
+# Kept in step by ask_question, post_answer and the moderation deletes, so the
+# tag list never has to scan questions. Each row also keeps the last
+# RECENT_ANSWERS_KEPT answer ids it counted (recent_answers), so a retried
+# answer_added job skips the rows it already updated.
+RECENT_ANSWERS_KEPT = 100
+
+async def _apply(changes, now=None):
+    # changes: tag -> {field: delta}
+    if not changes:
+        return
+    updates = []
+    for tag, deltas in changes.items():
+        update = {"$inc": {"question_count": 0, "answered_count": 0, "answer_count": 0, **deltas}}
+        if now is not None:
+            update["$max"] = {"last_activity_at": now}
+        updates.append(UpdateOne({"_id": tag}, update, upsert=now is not None))
+    await db.tag_stats.bulk_write(updates, ordered=False)
+    if now is None:
+        await db.tag_stats.delete_many({"_id": {"$in": list(changes)}, "question_count": {"$lte": 0}})
+
+def _distinct(tags):
+    return [t for t in dict.fromkeys(tags or []) if t]
+
+async def question_added(tags, now: datetime):
+    await _apply({t: {"question_count": 1} for t in _distinct(tags)}, now)
+
+async def answer_added(answer_id: str, tags, first_answer: bool, now: datetime):
+    # Runs as a retried job. Rows are never upserted here: a tag whose
+    # questions were all deleted before the job ran stays deleted.
+    updates = [
+        UpdateOne({"_id": tag, "recent_answers": {"$ne": answer_id}}, {
+            "$inc": {"answer_count": 1, "answered_count": 1 if first_answer else 0},
+            "$max": {"last_activity_at": now},
+            "$push": {"recent_answers": {"$each": [answer_id], "$slice": -RECENT_ANSWERS_KEPT}},
+        })
+        for tag in _distinct(tags)
+    ]
+    if updates:
+        await db.tag_stats.bulk_write(updates, ordered=False)
+
+async def questions_removed(questions):
+    # questions: the deleted question docs, with tags and answer_count
+    changes = {}
+    for q in questions:
+        for tag in _distinct(q.get("tags")):
+            deltas = changes.setdefault(tag, {"question_count": 0, "answered_count": 0, "answer_count": 0})
+            deltas["question_count"] -= 1
+            deltas["answered_count"] -= 1 if q.get("answer_count", 0) > 0 else 0
+            deltas["answer_count"] -= q.get("answer_count", 0)
+    await _apply(changes)
+
+async def answers_removed(questions, removed_per_question):
+    # questions: the parent docs after their answer_count was decremented;
+    # removed_per_question: parent _id -> answers deleted
+    changes = {}
+    for q in questions:
+        removed = removed_per_question.get(q["_id"], 0)
+        for tag in _distinct(q.get("tags")):
+            deltas = changes.setdefault(tag, {"answered_count": 0, "answer_count": 0})
+            deltas["answer_count"] -= removed
+            if removed and q.get("answer_count", 0) <= 0:
+                deltas["answered_count"] -= 1
+    await _apply(changes)
+
+async def build_tag_stats():
+    # One-off migration: materialize stats for questions posted before tag_stats
+    if await db.migrations.find_one({"_id": "tag_stats"}):
+        return
+    await (await db.questions.aggregate([
+        {"$set": {"tags": {"$setUnion": [{"$ifNull": ["$tags", []]}, []]}}},
+        {"$unwind": "$tags"},
+        {"$group": {
+            "_id": "$tags",
+            "question_count": {"$sum": 1},
+            "answered_count": {"$sum": {"$cond": [{"$gt": [{"$ifNull": ["$answer_count", 0]}, 0]}, 1, 0]}},
+            "answer_count": {"$sum": {"$ifNull": ["$answer_count", 0]}},
+            "last_activity_at": {"$max": {"$ifNull": ["$updated_at", "$created_at"]}},
+        }},
+        {"$match": {"_id": {"$nin": [None, ""]}}},
+        {"$merge": {"into": "tag_stats", "whenMatched": "replace"}},
+    ])).to_list()
+    await db.migrations.insert_one({"_id": "tag_stats", "applied_at": datetime.utcnow()})
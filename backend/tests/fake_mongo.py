@@ -0,0 +1,97 @@
+import types
+from bson import ObjectId
+
+# Just enough of an async pymongo collection, in memory, for the cascade and
+# counter code: equality/$in/$gt/$lte/$ne/$exists filters and
+# $inc/$set/$max/$push/$setOnInsert updates
+
+def _matches_value(value, condition):
+    if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$in" and not any(_matches_value(value, a) for a in arg):
+                return False
+            if op == "$gt" and not (value is not None and value > arg):
+                return False
+            if op == "$lte" and not (value is not None and value <= arg):
+                return False
+            if op == "$exists" and (value is not None) != arg:
+                return False
+            if op == "$ne" and (arg in value if isinstance(value, list) else value == arg):
+                return False
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+def matches(doc, query):
+    return all(_matches_value(doc.get(field), condition) for field, condition in query.items())
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+    async def to_list(self):
+        return list(self.docs)
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+        for doc in self.docs:
+            doc.setdefault("_id", ObjectId())
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([dict(d) for d in self.docs if matches(d, query or {})])
+
+    async def find_one(self, query=None, projection=None):
+        found = [d for d in self.docs if matches(d, query or {})]
+        return dict(found[0]) if found else None
+
+    async def distinct(self, field, query=None):
+        return list(dict.fromkeys(d.get(field) for d in self.docs if matches(d, query or {})))
+
+    async def delete_many(self, query):
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if not matches(d, query)]
+        return types.SimpleNamespace(deleted_count=before - len(self.docs))
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if matches(doc, query):
+                self._apply(doc, update)
+                return types.SimpleNamespace(matched_count=1)
+        if upsert:
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            doc.update(update.get("$setOnInsert", {}))
+            self._apply(doc, update)
+            self.docs.append(doc)
+        return types.SimpleNamespace(matched_count=0)
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            await self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    def _apply(self, doc, update):
+        for field, delta in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + delta
+        for field, value in update.get("$max", {}).items():
+            if doc.get(field) is None or value > doc[field]:
+                doc[field] = value
+        doc.update(update.get("$set", {}))
+        for field, push in update.get("$push", {}).items():
+            doc[field] = (doc.get(field, []) + push["$each"])[push.get("$slice", None):]
+
+class FakeDb:
+    def __init__(self, **collections):
+        self._collections = {name: FakeCollection(docs) for name, docs in collections.items()}
+
+    def __getattr__(self, name):
+        return self._collections.setdefault(name, FakeCollection())
+
+    def __getitem__(self, name):
+        return getattr(self, name)
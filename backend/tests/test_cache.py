@@ -0,0 +1,30 @@
+from cache import TTLCache
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(10, ttl=5)
+    cache.set("a", 1)
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+
+def test_pop_and_zero_size():
+    cache = TTLCache(10)
+    cache.set("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "missing") == "missing"
+    disabled = TTLCache(0)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+import completion
+from completion import CompletionModel, tokenize
+
+class FakeStore:
+    # Posts by collection, served the way database.documents_after reads them
+    def __init__(self):
+        self.docs = {"questions": [], "answers": []}
+
+    def post(self, text, collection="questions"):
+        oid = ObjectId.from_datetime(datetime(2024, 1, 1) + timedelta(seconds=len(self.docs[collection])))
+        field = {"questions": "title", "answers": "content"}[collection]
+        self.docs[collection].append({"_id": oid, field: text})
+        return str(oid)
+
+    async def documents_after(self, collection, projection, last_id=None, limit=None, until=None):
+        docs = [
+            d for d in self.docs[collection]
+            if (not last_id or d["_id"] > ObjectId(last_id)) and (until is None or d["_id"] <= until)
+        ]
+        for doc in docs[:limit]:
+            yield doc
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(completion, "documents_after", store.documents_after)
+    return store
+
+def test_tokenize_splits_sentences_and_strips_markup():
+    assert tokenize("<p>Use React.memo here.</p><p>Then&nbsp;profile it!</p>") == [
+        ["use", "react.memo", "here"],
+        ["then", "profile", "it"],
+    ]
+
+def test_tokenize_keeps_code_like_words():
+    assert tokenize("c++ and c# and node.js") == [["c++", "and", "c#", "and", "node.js"]]
+
+def _model(path, store, *texts):
+    model = CompletionModel(str(path)).load()
+    for text in texts:
+        model.observe("question", store.post(text), text)
+    return model
+
+CORPUS = [
+    "react hooks rerender the component",
+    "react hooks share state",
+    "react router redirects",
+    "mongodb aggregation pipeline",
+]
+
+def test_completes_the_word_being_typed(tmp_path, store):
+    model = _model(tmp_path, store, *CORPUS)
+    assert model.suggest("rea") == ["react"]
+    assert model.suggest("react ho") == ["hooks"]
+
+def test_predicts_the_next_word_from_context(tmp_path, store):
+    model = _model(tmp_path, store, *CORPUS)
+    assert set(model.suggest("react hooks ")[:2]) == {"rerender", "share"}
+    assert model.suggest("react ")[0] == "hooks"
+
+def test_sentence_break_resets_the_context(tmp_path, store):
+    model = _model(tmp_path, store, *CORPUS)
+    # No trigram/bigram context after a full stop: falls back to unigrams
+    assert model.suggest("mongodb. ")[0] == "react"
+
+def test_editor_html_completes_the_last_paragraph(tmp_path, store):
+    model = _model(tmp_path, store, *CORPUS)
+    assert model.suggest("<p>react hooks</p><p>sh</p>")[0] == "share"
+    assert model.suggest("<p>react <strong>ho</strong></p>") == ["hooks"]
+    assert model.suggest("<p>react&nbsp;</p>")[0] == "hooks"
+
+def test_compaction_survives_a_reload(tmp_path, store):
+    model = _model(tmp_path, store, *CORPUS)
+    before = model.suggest("react ")
+    assert asyncio.run(model.compact()) == len(CORPUS)
+    assert model.suggest("react ") == before
+    reloaded = CompletionModel(str(tmp_path)).load()
+    assert reloaded.suggest("react ") == before
+    assert reloaded.marks == {"question": str(store.docs["questions"][-1]["_id"])}
+
+def test_deltas_merge_with_the_compacted_base(tmp_path, store):
+    model = _model(tmp_path, store, "react hooks")
+    asyncio.run(model.compact())
+    model.observe("answer", store.post("react router react router", "answers"), "react router react router")
+    assert model.suggest("react ")[:2] == ["router", "hooks"]
+
+def _unigram(model, word):
+    return int(model._base["unigrams"][model._base["ids"][word]])
+
+def test_workers_replaying_the_same_posts_count_them_once(tmp_path, store):
+    first = _model(tmp_path, store, "vue router")
+    second = CompletionModel(str(tmp_path)).load()
+    second.observe("question", str(store.docs["questions"][0]["_id"]), "vue router")
+    asyncio.run(first.compact())
+    asyncio.run(second.compact())
+    merged = CompletionModel(str(tmp_path)).load()
+    assert (_unigram(merged, "vue"), _unigram(merged, "router")) == (1, 1)
+
+def test_a_compaction_covers_every_workers_posts(tmp_path, store):
+    first = _model(tmp_path, store, "react hooks rerender")
+    second = _model(tmp_path, store, "mongodb aggregation")
+    asyncio.run(first.compact())
+    # The second worker's post was read back by the first worker's compaction
+    asyncio.run(second.compact())
+    assert second._delta.size == 0
+    assert second.suggest("mo") == ["mongodb"]
+    assert set(CompletionModel(str(tmp_path)).load().suggest("re")) == {"react", "rerender"}
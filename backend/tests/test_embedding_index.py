@@ -0,0 +1,65 @@
+import numpy as np
+from embedding_index import EmbeddingIndex
+
+def _vector(i, dim=8):
+    v = np.zeros(dim, dtype=np.float32)
+    v[i] = 1.0
+    return v
+
+def _index(path, **kwargs):
+    return EmbeddingIndex(str(path / "index"), **kwargs).load()
+
+def test_search_ranks_by_cosine_similarity(tmp_path):
+    index = _index(tmp_path)
+    index.add(["a", "b", "c"], [_vector(0), _vector(1), _vector(0) + _vector(1)])
+    hits = index.search(_vector(0), 2)
+    assert [key for key, _ in hits] == ["a", "c"]
+    assert hits[0][1] == 1.0
+
+def test_saved_rows_survive_a_reload(tmp_path):
+    index = _index(tmp_path)
+    index.add(["a", "b"], [_vector(0), _vector(1)])
+    index.save()
+    reloaded = _index(tmp_path)
+    assert len(reloaded) == 2 and "b" in reloaded
+    assert reloaded.search(_vector(1), 1)[0][0] == "b"
+
+def test_workers_sharing_the_files_keep_keys_with_their_rows(tmp_path):
+    a, b = _index(tmp_path, dedupe=False), _index(tmp_path, dedupe=False)
+    b.add(["qB"], [_vector(1)])
+    b.save()
+    a.add(["qA"], [_vector(0)])
+    a.save()
+    assert a.search(_vector(1), 1)[0][0] == "qB"
+    assert a.search(_vector(0), 1)[0][0] == "qA"
+    b.refresh()
+    assert b.search(_vector(0), 1)[0][0] == "qA"
+    assert b.last_key() == "qA"
+
+def test_dedupe_skips_keys_another_worker_saved(tmp_path):
+    a, b = _index(tmp_path), _index(tmp_path)
+    a.add(["react"], [_vector(0)])
+    b.add(["react", "vue"], [_vector(0), _vector(1)])
+    a.save()
+    b.save()
+    assert _index(tmp_path)._keys == ["react", "vue"]
+
+def test_rows_left_by_a_crashed_append_are_dropped(tmp_path):
+    index = _index(tmp_path)
+    index.add(["a"], [_vector(0)])
+    index.save()
+    # Vectors appended but the process died before writing the key
+    with open(index.vectors_path, "ab") as f:
+        f.write(_vector(2).tobytes())
+    other = _index(tmp_path)
+    assert len(other) == 1
+    other.add(["b"], [_vector(1)])
+    other.save()
+    assert _index(tmp_path).search(_vector(1), 1)[0][0] == "b"
+
+def test_a_different_stamp_discards_the_saved_index(tmp_path):
+    index = _index(tmp_path, stamp={"model": "x"})
+    index.add(["a"], [_vector(0)])
+    index.save()
+    assert len(_index(tmp_path, stamp={"model": "x"})) == 1
+    assert len(_index(tmp_path, stamp={"model": "y"})) == 0
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from inference_batcher import MicroBatcher
+
+def _submit_together(batcher, items):
+    with ThreadPoolExecutor(len(items)) as pool:
+        return list(pool.map(batcher.submit, items))
+
+def test_concurrent_calls_get_their_own_results():
+    calls = []
+
+    def double(items):
+        calls.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("test", double, max_batch_size=4, max_wait_ms=200)
+    assert _submit_together(batcher, [1, 2, 3, 4]) == [2, 4, 6, 8]
+    assert sum(calls) == 4
+    stats = batcher.stats()
+    assert (stats["batches"], stats["items"]) == (len(calls), 4)
+
+def test_batches_are_capped_at_max_batch_size():
+    sizes = []
+
+    def identity(items):
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher("test", identity, max_batch_size=2, max_wait_ms=50)
+    assert _submit_together(batcher, list(range(5))) == list(range(5))
+    assert max(sizes) <= 2 and sum(sizes) == 5
+
+def test_a_failing_batch_fails_every_caller():
+    def broken(items):
+        raise ValueError("model crashed")
+
+    batcher = MicroBatcher("test", broken, max_batch_size=4, max_wait_ms=50)
+    with pytest.raises(ValueError):
+        batcher.submit("a")
+    # The worker thread survives and serves the next batch
+    batcher.batch_fn = lambda items: items
+    assert batcher.submit("b") == "b"
+
+def test_wrong_result_count_fails_instead_of_misaligning():
+    batcher = MicroBatcher("test", lambda items: items[:-1], max_batch_size=4, max_wait_ms=200)
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(batcher.submit, i) for i in range(3)]
+        errors = [f.exception(timeout=5) for f in futures]
+    assert all(isinstance(e, RuntimeError) for e in errors)
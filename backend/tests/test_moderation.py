@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from bson import ObjectId
+import moderation
+import tag_stats
+import votes
+from fake_mongo import FakeDb
+
+@pytest.fixture
+def site(monkeypatch):
+    q1, q2 = ObjectId(), ObjectId()
+    a1, a2, a3 = ObjectId(), ObjectId(), ObjectId()
+    db = FakeDb(
+        questions=[
+            {"_id": q1, "tags": ["react"], "answer_count": 2, "version": 0},
+            {"_id": q2, "tags": ["react", "vue"], "answer_count": 1, "version": 0},
+        ],
+        answers=[
+            {"_id": a1, "question_id": str(q1)},
+            {"_id": a2, "question_id": str(q1)},
+            {"_id": a3, "question_id": str(q2)},
+        ],
+        tag_stats=[
+            {"_id": "react", "question_count": 2, "answered_count": 2, "answer_count": 3},
+            {"_id": "vue", "question_count": 1, "answered_count": 1, "answer_count": 1},
+        ],
+        flags=[
+            {"type": "question", "item_id": str(q1)},
+            {"type": "answer", "item_id": str(a3)},
+        ],
+        moderation_queue=[{"_id": f"question:{q1}"}, {"_id": f"answer:{a3}"}],
+        votes=[
+            {"target_type": "question", "target_id": str(q1), "user_id": "u1"},
+            {"target_type": "answer", "target_id": str(a1), "user_id": "u1"},
+        ],
+        notifications=[
+            {"user_id": "author", "link": f"/questions/{q1}", "answer_id": str(a1), "read": False},
+            {"user_id": "author", "link": f"/questions/{q1}", "answer_id": str(a2), "read": True},
+            {"user_id": "other", "link": f"/questions/{q2}", "answer_id": str(a3), "read": False},
+        ],
+    )
+    for module in (moderation, tag_stats, votes):
+        monkeypatch.setattr(module, "db", db)
+    removed, forgotten = [], []
+
+    async def notifications_removed(user_ids):
+        removed.append(sorted(user_ids))
+
+    monkeypatch.setattr(moderation.notification_hub, "notifications_removed", notifications_removed)
+    monkeypatch.setattr(moderation, "forget_thread_version", forgotten.append)
+    return db, (q1, q2), (a1, a2, a3), removed, forgotten
+
+def test_deleting_a_question_cascades_to_everything_under_it(site):
+    db, (q1, q2), (_, _, a3), removed, forgotten = site
+    assert asyncio.run(moderation.delete_questions([str(q1), "not-an-id"])) == (1, 2)
+    assert [q["_id"] for q in db.questions.docs] == [q2]
+    assert [a["question_id"] for a in db.answers.docs] == [str(q2)]
+    assert [(f["type"], f["item_id"]) for f in db.flags.docs] == [("answer", str(a3))]
+    assert db.votes.docs == []
+    assert [n["user_id"] for n in db.notifications.docs] == ["other"]
+    assert {t["_id"]: t["question_count"] for t in db.tag_stats.docs} == {"react": 1, "vue": 1}
+    # Only users who lost an unread notification are recounted
+    assert removed == [["author"]]
+    assert forgotten == [str(q1)]
+
+def test_deleting_answers_keeps_the_parent_in_step(site):
+    db, (q1, q2), (a1, a2, a3), removed, forgotten = site
+    assert asyncio.run(moderation.delete_answers([str(a3), str(a1)])) == 2
+    parents = {q["_id"]: q for q in db.questions.docs}
+    assert (parents[q1]["answer_count"], parents[q1]["version"]) == (1, 1)
+    assert (parents[q2]["answer_count"], parents[q2]["version"]) == (0, 1)
+    stats = {t["_id"]: t for t in db.tag_stats.docs}
+    assert (stats["react"]["answer_count"], stats["react"]["answered_count"]) == (1, 1)
+    assert (stats["vue"]["answer_count"], stats["vue"]["answered_count"]) == (0, 0)
+    assert [n["answer_id"] for n in db.notifications.docs] == [str(a2)]
+    assert removed == [["author", "other"]]
+    assert sorted(forgotten) == sorted([str(q1), str(q2)])
@@ -0,0 +1,86 @@
+import asyncio
+import types
+import pytest
+import notification_hub
+
+class FakeNotifications:
+    def __init__(self, unread):
+        self.unread = unread
+        self.counts = 0
+
+    async def count_documents(self, query):
+        self.counts += 1
+        return self.unread
+
+@pytest.fixture
+def hub(monkeypatch):
+    db = types.SimpleNamespace(notifications=FakeNotifications(3))
+    monkeypatch.setattr(notification_hub, "db", db)
+    monkeypatch.setattr(notification_hub, "_unread_counts", notification_hub.TTLCache(100))
+    monkeypatch.setattr(notification_hub, "_subscribers", {})
+    return db
+
+def _drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+def test_inserted_notification_reaches_subscribers_with_the_new_count(hub):
+    async def run():
+        queue = notification_hub.subscribe("u1")
+        assert await notification_hub.unread_count("u1") == 3
+        await notification_hub._apply_change({
+            "ns": {"coll": "notifications"},
+            "fullDocument": {"_id": "n1", "user_id": "u1", "message": "hi"},
+        })
+        return _drain(queue)
+
+    events = asyncio.run(run())
+    assert events == [
+        ("notification", {"_id": "n1", "user_id": "u1", "message": "hi"}),
+        ("unread_count", {"unread_count": 4}),
+    ]
+    assert hub.notifications.counts == 1
+
+def test_a_count_change_recounts_once_per_event(hub):
+    async def run():
+        queue = notification_hub.subscribe("u1")
+        await notification_hub.unread_count("u1")
+        hub.notifications.unread = 0
+        await notification_hub._apply_change({
+            "ns": {"coll": "notification_changes"}, "documentKey": {"_id": "u1"},
+        })
+        return _drain(queue)
+
+    assert asyncio.run(run()) == [("unread_count", {"unread_count": 0})]
+    assert hub.notifications.counts == 2
+
+def test_unsubscribed_users_are_not_recounted(hub):
+    async def run():
+        await notification_hub._apply_change({
+            "ns": {"coll": "notification_changes"}, "documentKey": {"_id": "u2"},
+        })
+
+    asyncio.run(run())
+    assert hub.notifications.counts == 0
+
+def test_marked_read_zeroes_the_count_without_a_watcher(hub):
+    async def run():
+        queue = notification_hub.subscribe("u1")
+        await notification_hub.marked_read("u1")
+        return _drain(queue), await notification_hub.unread_count("u1")
+
+    assert asyncio.run(run()) == ([("unread_count", {"unread_count": 0})], 0)
+    assert hub.notifications.counts == 0
+
+def test_removed_notifications_recount_subscribed_users(hub):
+    async def run():
+        queue = notification_hub.subscribe("u1")
+        await notification_hub.unread_count("u1")
+        hub.notifications.unread = 1
+        await notification_hub.notifications_removed(["u1", "u2"])
+        return _drain(queue)
+
+    assert asyncio.run(run()) == [("unread_count", {"unread_count": 1})]
+    assert hub.notifications.counts == 2
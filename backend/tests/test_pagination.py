@@ -0,0 +1,49 @@
+import base64
+from datetime import datetime
+import pytest
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+from pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor
+
+def _raw_cursor(value):
+    return base64.urlsafe_b64encode(json_util.dumps(value).encode("utf-8")).decode("ascii")
+
+@pytest.mark.parametrize("sort_value", [datetime(2024, 5, 1, 12, 30), 42, 3.5, "python", None])
+def test_cursor_round_trip(sort_value):
+    last_id = ObjectId()
+    assert decode_cursor(encode_cursor(sort_value, last_id)) == (sort_value, last_id)
+
+def test_cursor_accepts_string_ids():
+    # tag_stats documents are keyed by the tag itself
+    assert decode_cursor(encode_cursor(7, "fastapi")) == (7, "fastapi")
+
+@pytest.mark.parametrize("value", [
+    [{"$ne": None}, str(ObjectId())],
+    [[1, 2], str(ObjectId())],
+    [1, {"$gt": ""}],
+    [1],
+    {"a": 1},
+])
+def test_decode_rejects_operators_and_bad_shapes(value):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(_raw_cursor(value))
+    assert error.value.status_code == 400
+
+def test_decode_rejects_garbage():
+    with pytest.raises(HTTPException):
+        decode_cursor("not a cursor!")
+
+def test_keyset_filter_continues_after_the_cursor_row():
+    last_id = ObjectId()
+    assert keyset_filter("votes", encode_cursor(5, last_id)) == {
+        "$or": [
+            {"votes": {"$lt": 5}},
+            {"votes": 5, "_id": {"$lt": last_id}},
+        ]
+    }
+
+def test_next_cursor_only_when_more_rows_exist():
+    rows = [{"_id": ObjectId(), "votes": v} for v in (9, 7, 7)]
+    assert next_cursor(rows[:2], "votes", 2) is None
+    cursor = next_cursor(rows, "votes", 2)
+    assert decode_cursor(cursor) == (7, rows[1]["_id"])
@@ -0,0 +1,35 @@
+from html_text import plain_text, preview
+from routes.search import SNIPPET_LENGTH, _terms, highlight, snippet
+
+def test_terms_skip_negated_words():
+    assert _terms("async -sync cache") == ["async", "cache"]
+
+def test_highlight_escapes_around_marks():
+    assert highlight("a <b> & amp", ["amp"]) == "a &lt;b&gt; &amp; <mark>amp</mark>"
+
+def test_highlight_never_matches_inside_entities():
+    # Matching happens on the plain text, so the escaped "&amp;" is untouched
+    assert highlight("fish & chips", ["amp", "lt"]) == "fish &amp; chips"
+
+def test_highlight_without_terms_only_escapes():
+    assert highlight("<script>", []) == "&lt;script&gt;"
+
+def test_snippet_decodes_entities_once():
+    assert snippet("<p>Tom &amp; Jerry &lt;3</p>", ["jerry"]) == "Tom &amp; <mark>Jerry</mark> &lt;3"
+
+def test_snippet_starts_near_the_first_match():
+    text = "<p>" + "filler " * 100 + "needle here</p>"
+    result = snippet(text, ["needle"])
+    assert result.startswith("…")
+    assert "<mark>needle</mark>" in result
+    assert len(plain_text(result)) <= SNIPPET_LENGTH + 2
+
+def test_plain_text_strips_tags_and_whitespace():
+    assert plain_text("<p>a</p>\n<p>b &amp;&nbsp; c</p>") == "a b & c"
+
+def test_preview_truncates_the_text_not_the_markup():
+    markup = '<img src="data:image/png;base64,' + "A" * 5000 + '"><p>' + "word " * 100 + "</p>"
+    result = preview(markup, 50)
+    assert result.endswith("…")
+    assert "<" not in result and "A" * 10 not in result
+    assert len(result) <= 51
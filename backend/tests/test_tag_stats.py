@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+import pytest
+import tag_stats
+from fake_mongo import FakeDb
+
+NOW = datetime(2024, 1, 2)
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDb()
+    monkeypatch.setattr(tag_stats, "db", db)
+    return db
+
+def _stats(db):
+    return {
+        t["_id"]: (t["question_count"], t["answered_count"], t["answer_count"])
+        for t in db.tag_stats.docs
+    }
+
+def test_questions_and_answers_are_counted_per_distinct_tag(db):
+    asyncio.run(tag_stats.question_added(["react", "react", "vue", ""], NOW))
+    asyncio.run(tag_stats.answer_added("a1", ["react", "vue"], True, NOW))
+    asyncio.run(tag_stats.answer_added("a2", ["react", "vue"], False, NOW))
+    assert _stats(db) == {"react": (1, 1, 2), "vue": (1, 1, 2)}
+    assert db.tag_stats.docs[0]["last_activity_at"] == NOW
+
+def test_a_retried_answer_job_counts_each_tag_once(db):
+    asyncio.run(tag_stats.question_added(["react", "vue"], NOW))
+    collection = db.tag_stats
+    bulk_write = collection.bulk_write
+
+    async def fails_after_first(requests, ordered=True):
+        await bulk_write(requests[:1])
+        raise RuntimeError("connection lost after the first update")
+
+    collection.bulk_write = fails_after_first
+    with pytest.raises(RuntimeError):
+        asyncio.run(tag_stats.answer_added("a1", ["react", "vue"], True, NOW))
+    collection.bulk_write = bulk_write
+    asyncio.run(tag_stats.answer_added("a1", ["react", "vue"], True, NOW))
+    assert _stats(db) == {"react": (1, 1, 1), "vue": (1, 1, 1)}
+
+def test_an_answer_job_does_not_recreate_a_deleted_tag(db):
+    asyncio.run(tag_stats.question_added(["react"], NOW))
+    asyncio.run(tag_stats.questions_removed([{"tags": ["react"], "answer_count": 0}]))
+    assert db.tag_stats.docs == []
+    asyncio.run(tag_stats.answer_added("a1", ["react"], True, NOW))
+    assert db.tag_stats.docs == []
+
+def test_removed_answers_unmark_questions_left_without_any(db):
+    asyncio.run(tag_stats.question_added(["react"], NOW))
+    asyncio.run(tag_stats.answer_added("a1", ["react"], True, NOW))
+    asyncio.run(tag_stats.answers_removed([{"_id": "q1", "tags": ["react"], "answer_count": 0}], {"q1": 1}))
+    assert _stats(db) == {"react": (1, 0, 0)}
@@ -0,0 +1,78 @@
+import asyncio
+import types
+import pytest
+from bson import ObjectId
+from fastapi import Request
+from pydantic import TypeAdapter
+from typing import List
+import thread_cache
+from cache import TTLCache
+
+class FakeQuestions:
+    def __init__(self, versions):
+        self.versions = versions
+
+    async def find_one(self, query, projection=None):
+        version = self.versions.get(query["_id"])
+        return None if version is None else {"_id": query["_id"], "version": version}
+
+@pytest.fixture
+def thread(monkeypatch):
+    qid = ObjectId()
+    primary = types.SimpleNamespace(name="primary", questions=FakeQuestions({qid: 3}))
+    secondary = types.SimpleNamespace(name="secondary")
+    monkeypatch.setattr(thread_cache, "db", primary)
+    monkeypatch.setattr(thread_cache, "read_db", secondary)
+    monkeypatch.setattr(thread_cache, "_versions", TTLCache(0))
+    monkeypatch.setattr(thread_cache, "_responses", TTLCache(10))
+    return str(qid)
+
+ADAPTER = TypeAdapter(List[str])
+
+def _request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "headers": headers})
+
+def _builder(seen_by_source, reads):
+    async def build(source):
+        reads.append(source.name)
+        return seen_by_source[source.name], [source.name]
+    return build
+
+def _get(qid, build, etag=None):
+    return asyncio.run(thread_cache.conditional_get(_request(etag), "answers", qid, build, ADAPTER))
+
+def test_body_carries_the_version_etag_and_is_cached(thread):
+    reads = []
+    build = _builder({"secondary": 3}, reads)
+    response = _get(thread, build)
+    assert response.headers["etag"] == f'W/"answers-{thread}-3"'
+    assert response.body == b'["secondary"]'
+    _get(thread, build)
+    assert reads == ["secondary"]
+
+def test_matching_if_none_match_gets_a_304_without_reading(thread):
+    reads = []
+    response = _get(thread, _builder({"secondary": 3}, reads), etag=f'W/"answers-{thread}-3"')
+    assert response.status_code == 304
+    assert reads == []
+
+def test_a_stale_secondary_is_reread_from_the_primary(thread):
+    reads = []
+    response = _get(thread, _builder({"secondary": 2, "primary": 3}, reads))
+    assert reads == ["secondary", "primary"]
+    assert response.body == b'["primary"]'
+
+def test_a_new_version_is_not_served_from_the_old_cache_entry(thread):
+    reads = []
+    build = _builder({"secondary": 3}, reads)
+    _get(thread, build)
+    thread_cache.db.questions.versions[ObjectId(thread)] = 4
+    build = _builder({"secondary": 4}, reads)
+    assert _get(thread, build).headers["etag"] == f'W/"answers-{thread}-4"'
+    assert reads == ["secondary", "secondary"]
+
+def test_missing_question_falls_through_to_build(thread):
+    reads = []
+    missing = str(ObjectId())
+    assert _get(missing, _builder({"primary": None}, reads)) == ["primary"]
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+import votes
+
+class FakeVotes:
+    # Just enough of the votes collection for cast_vote's conditional upsert
+    def __init__(self):
+        self.docs = {}
+        self.deleted = []
+
+    async def find_one_and_update(self, query, update, **kwargs):
+        key = (query["target_type"], query["target_id"], query["user_id"])
+        previous = self.docs.get(key)
+        if previous is not None and previous["direction"] == query["direction"]["$ne"]:
+            raise DuplicateKeyError("duplicate vote")
+        self.docs[key] = {"direction": update["$set"]["direction"]}
+        return previous
+
+    async def delete_many(self, query):
+        self.deleted.append(query)
+
+class FakeTargets:
+    def __init__(self, *ids):
+        self.votes = {target_id: 0 for target_id in ids}
+
+    async def find_one_and_update(self, query, update, **kwargs):
+        if query["_id"] not in self.votes:
+            return None
+        self.votes[query["_id"]] += update["$inc"]["votes"]
+        return {"_id": query["_id"]}
+
+class FakeDb:
+    def __init__(self, *question_ids):
+        self.votes = FakeVotes()
+        self.questions = FakeTargets(*question_ids)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    question_id = ObjectId()
+    db = FakeDb(question_id)
+    monkeypatch.setattr(votes, "db", db)
+    monkeypatch.setattr(votes.database, "supports_transactions", False)
+    return db, question_id
+
+def test_first_vote_counts_once(fake_db):
+    _, question_id = fake_db
+    assert asyncio.run(votes.cast_vote("question", str(question_id), "u1", "up")) == 1
+    assert asyncio.run(votes.cast_vote("question", str(question_id), "u2", "down")) == -1
+
+def test_switching_direction_moves_the_score_by_two(fake_db):
+    _, question_id = fake_db
+    asyncio.run(votes.cast_vote("question", str(question_id), "u1", "down"))
+    assert asyncio.run(votes.cast_vote("question", str(question_id), "u1", "up")) == 2
+
+def test_repeating_a_vote_is_rejected(fake_db):
+    _, question_id = fake_db
+    asyncio.run(votes.cast_vote("question", str(question_id), "u1", "up"))
+    with pytest.raises(votes.AlreadyVoted):
+        asyncio.run(votes.cast_vote("question", str(question_id), "u1", "up"))
+
+def test_apply_vote_updates_the_target_score(fake_db):
+    db, question_id = fake_db
+    asyncio.run(votes.apply_vote("question", str(question_id), "u1", "up"))
+    asyncio.run(votes.apply_vote("question", str(question_id), "u2", "down"))
+    asyncio.run(votes.apply_vote("question", str(question_id), "u2", "up"))
+    assert db.questions.votes[question_id] == 2
+
+def test_vote_on_missing_target_is_removed_again(fake_db):
+    db, _ = fake_db
+    missing = str(ObjectId())
+    with pytest.raises(votes.VoteTargetNotFound):
+        asyncio.run(votes.apply_vote("question", missing, "u1", "up"))
+    assert db.votes.deleted == [{"target_type": "question", "target_id": {"$in": [missing]}}]
+
+def test_invalid_target_id_writes_nothing(fake_db):
+    db, _ = fake_db
+    with pytest.raises(Exception):
+        asyncio.run(votes.apply_vote("question", "not-an-id", "u1", "up"))
+    assert db.votes.docs == {}
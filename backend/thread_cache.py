@@ -0,0 +1,66 @@
+import os
+from bson import ObjectId
+from fastapi import Request, Response
+from cache import TTLCache
+from database import db, read_db
+
+# Every question carries a `version` that the write paths bump whenever the
+# question, its answers or their votes change. Reads of a thread are stamped
+# with it as an ETag, and If-None-Match gets a 304.
+#
+# THREAD_VERSION_TTL > 0 caches versions in-process for that many seconds so
+# hot threads skip even the version lookup; writes made by this worker are
+# seen immediately, writes from other workers after at most the TTL.
+# RESPONSE_CACHE_SIZE > 0 keeps that many rendered thread responses per worker.
+THREAD_VERSION_TTL = float(os.getenv("THREAD_VERSION_TTL", "0"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "0"))
+
+_versions = TTLCache(10000 if THREAD_VERSION_TTL else 0, THREAD_VERSION_TTL)
+_responses = TTLCache(RESPONSE_CACHE_SIZE)
+
+async def thread_version(qid: str):
+    version = _versions.get(qid)
+    if version is None:
+        if not ObjectId.is_valid(qid):
+            return None
+        question = await db.questions.find_one({"_id": ObjectId(qid)}, {"version": 1})
+        if not question:
+            return None
+        version = question.get("version", 0)
+        _versions.set(qid, version)
+    return version
+
+def forget_thread_version(qid: str):
+    # For writes that $inc the question's version themselves
+    _versions.pop(qid)
+
+async def bump_thread_version(qid: str):
+    forget_thread_version(qid)
+    if ObjectId.is_valid(qid):
+        await db.questions.update_one({"_id": ObjectId(qid)}, {"$inc": {"version": 1}})
+
+async def conditional_get(request: Request, kind: str, qid: str, build, adapter):
+    # build(source) reads the thread from the given database and returns
+    # (question version it saw, body); it only runs on a cache miss. The body
+    # is validated and rendered through adapter, a TypeAdapter of the route's
+    # response model, since a raw Response bypasses FastAPI's own.
+    version = await thread_version(qid)
+    if version is None:
+        return (await build(db))[1]
+
+    etag = f'W/"{kind}-{qid}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    body = _responses.get((kind, qid, version))
+    if body is None:
+        # Thread writes bump the version, so a secondary whose read shows an
+        # older one is missing some of them. Re-read from the primary rather
+        # than serve (or cache) a stale body under the current ETag.
+        seen, content = await build(read_db)
+        if seen is None or seen < version:
+            seen, content = await build(db)
+        body = adapter.dump_json(adapter.validate_python(content), by_alias=True)
+        _responses.set((kind, qid, version), body)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,127 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import InsertOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import database
+from database import db
+
+VOTE_VALUES = {"up": 1, "down": -1}
+TARGET_COLLECTIONS = {"question": "questions", "answer": "answers"}
+
+class AlreadyVoted(Exception):
+    pass
+
+class VoteTargetNotFound(Exception):
+    pass
+
+async def cast_vote(target_type: str, target_id: str, user_id: str, direction: str, session=None):
+    # One conditional upsert against the unique (target_type, target_id, user_id)
+    # index: it matches only an opposite vote, inserts when there is none, and
+    # hits the unique index when the same vote already exists. Returns the
+    # change to apply to the target's score.
+    now = datetime.utcnow()
+    try:
+        previous = await db.votes.find_one_and_update(
+            {
+                "target_type": target_type,
+                "target_id": target_id,
+                "user_id": user_id,
+                "direction": {"$ne": direction},
+            },
+            {"$set": {"direction": direction, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            projection={"direction": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+            session=session,
+        )
+    except DuplicateKeyError:
+        raise AlreadyVoted()
+    return VOTE_VALUES[direction] - (VOTE_VALUES[previous["direction"]] if previous else 0)
+
+async def apply_vote(target_type: str, target_id: str, user_id: str, direction: str, inc=None, projection=None):
+    # Records the vote and applies it to the target's score, plus any extra
+    # $inc fields. Returns the target document (projected).
+    target_oid = ObjectId(target_id)  # invalid ids fail before anything is written
+
+    async def write(session=None):
+        change = await cast_vote(target_type, target_id, user_id, direction, session)
+        target = await db[TARGET_COLLECTIONS[target_type]].find_one_and_update(
+            {"_id": target_oid},
+            {"$inc": {"votes": change, **(inc or {})}},
+            projection=projection or {"_id": 1},
+            session=session,
+        )
+        if target is None:
+            raise VoteTargetNotFound()
+        return target
+
+    # On a replica set both writes commit together, and a missing target
+    # aborts the vote with them
+    if database.supports_transactions:
+        return await database.run_in_transaction(write)
+    # Standalone server: a vote recorded against a missing target is removed
+    # again. A crash between the two writes leaves the score off by this
+    # vote; recount_votes() repairs it from the votes collection.
+    try:
+        return await write()
+    except VoteTargetNotFound:
+        await delete_votes(target_type, [target_id])
+        raise
+
+async def recount_votes(target_type: str, target_ids=None):
+    # Rewrites `votes` on the targets from the votes collection
+    match = {"target_type": target_type}
+    if target_ids is not None:
+        match["target_id"] = {"$in": list(target_ids)}
+    totals = {
+        row["_id"]: row["total"]
+        async for row in await db.votes.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$target_id", "total": {"$sum": {"$cond": [{"$eq": ["$direction", "up"]}, 1, -1]}}}},
+        ])
+    }
+    collection = db[TARGET_COLLECTIONS[target_type]]
+    query = {} if target_ids is None else {"_id": {"$in": [ObjectId(i) for i in target_ids if ObjectId.is_valid(i)]}}
+    async for doc in collection.find(query, {"votes": 1}):
+        total = totals.get(str(doc["_id"]), 0)
+        if doc.get("votes", 0) != total:
+            # Skipped if a vote landed on the target in the meantime
+            await collection.update_one({"_id": doc["_id"], "votes": doc.get("votes")}, {"$set": {"votes": total}})
+
+async def delete_votes(target_type: str, target_ids):
+    await db.votes.delete_many({"target_type": target_type, "target_id": {"$in": list(target_ids)}})
+
+async def migrate_legacy_voters():
+    # Moves the old per-document `voters` maps into the votes collection, once
+    if await db.migrations.find_one({"_id": "votes_collection"}):
+        return
+    for collection, target_type in (("questions", "question"), ("answers", "answer")):
+        async for doc in db[collection].find({"voters": {"$exists": True}}, {"voters": 1}):
+            voters = doc["voters"]
+            # post_answer used to initialise voters as a list; those hold no votes
+            ops = [
+                InsertOne({
+                    "target_type": target_type,
+                    "target_id": str(doc["_id"]),
+                    "user_id": user_id,
+                    "direction": direction,
+                    "created_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow(),
+                })
+                for user_id, direction in (voters.items() if isinstance(voters, dict) else [])
+                if direction in VOTE_VALUES
+            ]
+            if ops:
+                try:
+                    await db.votes.bulk_write(ops, ordered=False)
+                except BulkWriteError:
+                    pass  # already migrated by an interrupted earlier run
+            await db[collection].update_one({"_id": doc["_id"]}, {"$unset": {"voters": ""}})
+    await db.migrations.insert_one({"_id": "votes_collection", "applied_at": datetime.utcnow()})
+
+async def recount_all_votes():
+    for target_type in TARGET_COLLECTIONS:
+        await recount_votes(target_type)
+
+if __name__ == "__main__":
+    database.run_command("votes.py", "recount", recount_all_votes)
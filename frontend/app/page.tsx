@@ -22,6 +22,9 @@ interface Question {
   votes: number;
 }
 
+// Feed sort buttons -> the backend's sort modes
+const sortModes = { newest: 'newest', popular: 'votes', unanswered: 'unanswered' } as const;
+
 const allTags = ['React', 'JavaScript', 'Node.js', 'JWT', 'Authentication', 'Security', 'Database', 'PostgreSQL', 'Schema Design', 'Hooks'];
 
 export default function Home() {
@@ -30,18 +33,33 @@ export default function Home() {
   const [error, setError] = useState<string | null>(null);
   const [selectedTags, setSelectedTags] = useState<string[]>([]);
   const [sortBy, setSortBy] = useState<'newest' | 'popular' | 'unanswered'>('newest');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchQuestions();
-  }, []);
+  }, [sortBy, selectedTags]);
 
-  const fetchQuestions = async () => {
+  // The feed is sorted, filtered and paginated on the server; "Load more"
+  // appends the page after the cursor the last response returned
+  const fetchQuestions = async (cursor?: string) => {
     try {
-      setLoading(true);
-      const result = await questionsApi.getAll();
-      
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+        setError(null);
+      }
+      const result = await questionsApi.getAll({
+        sort: sortModes[sortBy],
+        tag: selectedTags[0],
+        cursor,
+      });
+
       if (result.success && result.data) {
-        setQuestions(result.data);
+        const page = result.data;
+        setQuestions((prev) => (cursor ? [...prev, ...page] : page));
+        setNextCursor(result.nextCursor || null);
       } else {
         setError(result.error || 'Failed to fetch questions');
       }
@@ -49,6 +67,7 @@ export default function Home() {
       setError('Failed to fetch questions');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -66,9 +85,7 @@ export default function Home() {
     hasAcceptedAnswer: !!q.accepted_answer_id,
   }));
 
-  const filteredQuestions = transformedQuestions.filter((question) =>
-    selectedTags.length === 0 || question.tags.some((tag) => selectedTags.includes(tag))
-  );
+  const filteredQuestions = transformedQuestions;
 
   if (loading) {
     return (
@@ -87,7 +104,7 @@ export default function Home() {
         <div className="text-center py-12">
           <p className="text-red-600 mb-4">{error}</p>
           <button 
-            onClick={fetchQuestions}
+            onClick={() => fetchQuestions()}
             className="bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700"
           >
             Try Again
@@ -119,7 +136,8 @@ export default function Home() {
               tags={allTags}
               selectedTags={selectedTags}
               onTagToggle={(tag) =>
-                setSelectedTags((prev) => (prev.includes(tag) ? prev.filter((t) => t !== tag) : [...prev, tag]))
+                // The feed filters on one tag at a time
+                setSelectedTags((prev) => (prev.includes(tag) ? [] : [tag]))
               }
             />
           </div>
@@ -148,7 +166,7 @@ export default function Home() {
                 ))}
               </div>
               <span className="text-sm text-gray-500">
-                {filteredQuestions.length} question{filteredQuestions.length !== 1 ? 's' : ''}
+                {filteredQuestions.length}{nextCursor ? '+' : ''} question{filteredQuestions.length !== 1 ? 's' : ''}
               </span>
             </div>
           </motion.div>
@@ -167,6 +185,18 @@ export default function Home() {
             ))}
           </div>
 
+          {nextCursor && (
+            <div className="text-center mt-6">
+              <button
+                onClick={() => fetchQuestions(nextCursor)}
+                disabled={loadingMore}
+                className="bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700 disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
+
           {filteredQuestions.length === 0 && (
             <motion.div initial={{ opacity: 0 }} animate={{ opacity: 1 }} className="text-center py-12">
               <div className="text-gray-400 mb-4">
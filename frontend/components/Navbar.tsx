@@ -29,11 +29,14 @@ export function Navbar() {
     if (user) {
       fetchNotifications();
       fetchUnreadCount();
-      // Poll for notifications every 30 seconds
-      const interval = setInterval(() => {
-        fetchUnreadCount();
-      }, 30000);
-      return () => clearInterval(interval);
+      // New notifications and unread count changes are pushed by the server
+      const source = notificationsApi.subscribe({
+        onNotification: (notification) => {
+          setNotifications(prev => [notification, ...prev]);
+        },
+        onUnreadCount: setUnreadCount,
+      });
+      return () => source.close();
     }
   }, [user]);
 
@@ -4,6 +4,7 @@ interface ApiResponse<T> {
   success: boolean;
   data?: T;
   error?: string;
+  nextCursor?: string | null;
 }
 
 // Generic API call function
@@ -29,7 +30,8 @@ async function apiCall<T>(
     }
 
     const data = await response.json();
-    return { success: true, data };
+    // Paginated lists send the cursor for the next page in a header
+    return { success: true, data, nextCursor: response.headers.get('X-Next-Cursor') };
   } catch (error) {
     console.error('API call failed:', error);
     return {
@@ -63,8 +65,13 @@ export const authApi = {
 
 // Questions API
 export const questionsApi = {
-  getAll: async () => {
-    return apiCall<any[]>('/questions');
+  getAll: async (params: { sort?: string; tag?: string; cursor?: string; limit?: number } = {}) => {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== '') query.set(key, String(value));
+    });
+    const search = query.toString();
+    return apiCall<any[]>(`/questions${search ? `?${search}` : ''}`);
   },
 
   getById: async (id: string) => {
@@ -128,6 +135,25 @@ export const notificationsApi = {
       method: 'POST',
     });
   },
+
+  // Server-sent events: "notification" for each new notification and
+  // "unread_count" whenever the unread count changes
+  subscribe: (handlers: {
+    onNotification: (notification: any) => void;
+    onUnreadCount: (count: number) => void;
+  }) => {
+    const token = localStorage.getItem('stackit-token');
+    const source = new EventSource(
+      `${API_BASE_URL}/notifications/stream?token=${encodeURIComponent(token || '')}`
+    );
+    source.addEventListener('notification', (event) => {
+      handlers.onNotification(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('unread_count', (event) => {
+      handlers.onUnreadCount(JSON.parse((event as MessageEvent).data).unread_count);
+    });
+    return source;
+  },
 };
 
 // AI API